@@ -0,0 +1,10 @@
+"""
+benchmarks
+
+Stand-alone performance benchmarks for the API. Each module runs against a throwaway in-memory SQLite database built
+from the project's migrations (run `python3 manage.py makemigrations` first), and prints its figures as a table.
+
+Run a benchmark from the repository root, e.g.:
+
+    python3 -m benchmarks.bench_transfer
+"""
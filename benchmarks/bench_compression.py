@@ -0,0 +1,78 @@
+"""
+benchmarks.bench_compression
+
+Bandwidth and CPU trade-off of the response codings offered by todo_api.middleware.CompressionMiddleware, for
+/v1/lists/ payloads of typical sizes. Codings whose optional package is not installed are skipped.
+
+    python3 -m benchmarks.bench_compression
+"""
+
+from __future__ import print_function, unicode_literals
+
+import gzip
+from benchmarks.common import setup_django, seed, timed, report
+
+PAYLOADS = (
+    # (description, lists, tasks per list, child tasks per task)
+    ('one small list', 1, 5, 3),
+    ('one large list', 1, 100, 5),
+    ('full dump', 20, 100, 5),
+)
+
+REPEAT = 20
+
+
+def decompressors():
+    """
+    :return: Dict mapping each coding that can be benchmarked to a function decompressing it.
+    """
+    functions = {'gzip': gzip.decompress}
+    try:
+        import brotli
+        functions['br'] = brotli.decompress
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        functions['zstd'] = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    except ImportError:
+        pass
+    return functions
+
+
+def main():
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+    from todo_api.middleware import COMPRESSORS
+    from todo_list.models import ToDoList
+    from todo_list.serializers import TodoListSerializer
+
+    request = APIRequestFactory().get('/v1/lists/')
+    rows = []
+
+    for description, list_count, tasks_per_list, children_per_task in PAYLOADS:
+        ToDoList.objects.all().delete()
+        seed(list_count, tasks_per_list, children_per_task)
+        data = TodoListSerializer(ToDoList.objects.all(), many=True, context={'request': request}).data
+        payload = JSONRenderer().render(data)
+        rows.append((description, 'identity', len(payload), '100.0%', '-', '-'))
+
+        for encoding, decompress in sorted(decompressors().items()):
+            def compress():
+                compressor = COMPRESSORS[encoding]()
+                return compressor.compress(payload) + compressor.flush()
+
+            compressed, compress_seconds = timed(lambda: [compress() for _ in range(REPEAT)][-1])
+            _, decompress_seconds = timed(lambda: [decompress(compressed) for _ in range(REPEAT)])
+            rows.append((description, encoding, len(compressed), '%.1f%%' % (100.0 * len(compressed) / len(payload)),
+                         '%.3f' % (1000 * compress_seconds / REPEAT), '%.3f' % (1000 * decompress_seconds / REPEAT)))
+
+    report('Response compression of /v1/lists/ payloads',
+           ('payload', 'coding', 'bytes', 'of original', 'compress ms', 'decompress ms'),
+           rows)
+
+
+if __name__ == '__main__':
+    main()
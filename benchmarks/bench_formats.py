@@ -0,0 +1,76 @@
+"""
+benchmarks.bench_formats
+
+Payload size and server time of the response formats offered by the collection endpoints: JSON, MessagePack, and,
+for /v1/tasks/ and /v1/child_tasks/, columnar JSON and Arrow. The server time covers the whole view, from the
+queries to the rendered body. Formats whose optional package is not installed are skipped.
+
+    python3 -m benchmarks.bench_formats
+"""
+
+from __future__ import print_function, unicode_literals
+
+import logging
+import statistics
+from benchmarks.common import setup_django, seed, timed, report
+
+ENDPOINTS = (
+    # (path, viewset name)
+    ('/v1/lists/', 'TodoListTaskViewSet'),
+    ('/v1/tasks/', 'ParentTaskViewSet'),
+    ('/v1/child_tasks/', 'ChildTaskViewSet'),
+)
+
+FORMATS = (
+    # (description, Accept header)
+    ('JSON', 'application/json'),
+    ('MessagePack', 'application/msgpack'),
+    ('columnar JSON', 'application/vnd.todo.columnar+json'),
+    ('Arrow', 'application/vnd.apache.arrow.stream'),
+)
+
+REPEAT = 7
+
+
+def main():
+    setup_django()
+
+    from django.conf import settings
+    from django.test.utils import override_settings
+    from rest_framework.test import APIRequestFactory
+    from todo_list import views
+
+    # Formats an endpoint does not offer are refused with 406, which Django would log as a warning.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    row_count = seed(20, 100, 5)
+    factory = APIRequestFactory()
+    rows = []
+
+    # The benchmark is a single client requesting far more than the rate limits allow.
+    with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_CLASSES=())):
+        for path, viewset_name in ENDPOINTS:
+            view = getattr(views, viewset_name).as_view({'get': 'list'})
+            json_size = None
+
+            for description, accept in FORMATS:
+                def get():
+                    return view(factory.get(path, HTTP_ACCEPT=accept)).render()
+
+                response = get()
+                if response.status_code != 200:
+                    # Not offered by this endpoint, or its package is not installed.
+                    continue
+
+                seconds = statistics.median(timed(get)[1] for _ in range(REPEAT))
+                size = len(response.content)
+                json_size = json_size or size
+                rows.append((path, description, size, '%.1f%%' % (100.0 * size / json_size), '%.1f' % (1000 * seconds)))
+
+    report('Response formats of the collection endpoints (%d rows, median of %d requests)' % (row_count, REPEAT),
+           ('endpoint', 'format', 'bytes', 'of JSON', 'server ms'),
+           rows)
+
+
+if __name__ == '__main__':
+    main()
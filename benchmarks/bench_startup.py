@@ -0,0 +1,75 @@
+"""
+benchmarks.bench_startup
+
+Cold start of a WSGI worker: the time to import each entry point, the time it then takes to answer its first request
+(GET of the API root, which needs no database), the time of a second request for comparison, and the worker's peak
+resident memory. Each figure is the median over fresh Python processes.
+
+    python3 -m benchmarks.bench_startup
+"""
+
+from __future__ import print_function, unicode_literals
+
+import json
+import statistics
+import subprocess
+import sys
+from benchmarks.common import report
+
+ENTRY_POINTS = (
+    # (description, WSGI module)
+    ('full settings', 'todo_api.wsgi'),
+    ('API-only settings', 'todo_api.wsgi_api'),
+)
+
+RUNS = 15
+
+# Run in a fresh interpreter for each measurement, so that nothing is imported beforehand.
+WORKER = '''
+import importlib, io, json, resource, sys, time, warnings
+warnings.simplefilter('ignore')
+
+def get(application, path):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+               'REMOTE_ADDR': '127.0.0.1', 'HTTP_ACCEPT': 'application/json', 'wsgi.input': io.BytesIO(),
+               'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr}
+    statuses = []
+    body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    assert statuses[0].startswith('200'), statuses[0]
+    return body
+
+started = time.perf_counter()
+application = importlib.import_module(sys.argv[1]).application
+imported = time.perf_counter()
+get(application, '/')
+first = time.perf_counter()
+get(application, '/')
+second = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first': first - imported, 'second': second - first,
+                  'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+'''
+
+
+def measure(module):
+    """
+    :return: Dict of the median import, first and second request seconds, and peak RSS in KiB, over RUNS processes.
+    """
+    samples = [json.loads(subprocess.check_output([sys.executable, '-c', WORKER, module])) for _ in range(RUNS)]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    rows = []
+    for description, module in ENTRY_POINTS:
+        result = measure(module)
+        rows.append((description, module, '%.1f' % (1000 * result['import']), '%.1f' % (1000 * result['first']),
+                     '%.1f' % (1000 * (result['import'] + result['first'])), '%.2f' % (1000 * result['second']),
+                     '%d' % (result['rss'] // 1024)))
+
+    report('Cold start of a WSGI worker (median of %d processes)' % RUNS,
+           ('settings', 'entry point', 'import ms', 'first request ms', 'ready ms', 'second request ms', 'peak MiB'),
+           rows)
+
+
+if __name__ == '__main__':
+    main()
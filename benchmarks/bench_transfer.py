@@ -0,0 +1,84 @@
+"""
+benchmarks.bench_transfer
+
+Throughput and peak Python memory of the export_todos / import_todos streaming paths (todo_list.transfer), at two
+dataset sizes. Peak memory should stay flat as the dataset grows.
+
+    python3 -m benchmarks.bench_transfer
+"""
+
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+import tempfile
+import tracemalloc
+from benchmarks.common import setup_django, seed, timed, report
+
+SIZES = (
+    # (lists, tasks per list, child tasks per task)
+    (10, 100, 10),
+    (10, 400, 10),
+)
+
+
+def peak_memory(function, *args, **kwargs):
+    """
+    :return: Peak Python memory traced while running the function, in KiB.
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def export_to(path, fmt):
+    from todo_list.transfer import export_records, write_records
+
+    with io.open(path, 'w', encoding='utf-8', newline='') as stream:
+        return write_records(export_records(), stream, fmt)
+
+
+def import_from(path, fmt):
+    from todo_list.transfer import import_records, read_records
+
+    with io.open(path, 'r', encoding='utf-8', newline='') as stream:
+        return import_records(read_records(stream, fmt))
+
+
+def main():
+    setup_django()
+
+    from todo_list.models import ToDoList, ParentTask, ChildTask
+
+    rows = []
+    for list_count, tasks_per_list, children_per_task in SIZES:
+        for model in (ChildTask, ParentTask, ToDoList):
+            model.objects.all().delete()
+        row_count = seed(list_count, tasks_per_list, children_per_task)
+
+        for fmt in ('ndjson', 'csv'):
+            fd, path = tempfile.mkstemp(suffix='.' + fmt)
+            os.close(fd)
+            try:
+                # Time each direction untraced, then trace a second run for its memory peak.
+                _, export_seconds = timed(export_to, path, fmt)
+                export_peak = peak_memory(export_to, path, fmt)
+                _, import_seconds = timed(import_from, path, fmt)
+                import_peak = peak_memory(import_from, path, fmt)
+            finally:
+                os.remove(path)
+
+            rows.append((row_count, fmt,
+                         '%d' % (row_count / export_seconds), export_peak,
+                         '%d' % (row_count / import_seconds), import_peak))
+
+    report('Bulk export / import (in-memory SQLite)',
+           ('rows', 'format', 'export rows/s', 'export peak KiB', 'import rows/s', 'import peak KiB'),
+           rows)
+
+
+if __name__ == '__main__':
+    main()
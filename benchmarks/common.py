@@ -0,0 +1,82 @@
+"""
+benchmarks.common
+
+Helpers shared by the benchmark modules: Django setup against a throwaway database, test data, timing and reporting.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import time
+from datetime import datetime, timedelta
+
+
+def setup_django(settings_module='todo_api.settings'):
+    """
+    Configure Django and create an in-memory test database from the migrations.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    # Keep DEBUG off so that Django does not log every query, which would skew time and memory figures.
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0)
+
+
+def seed(list_count, tasks_per_list, children_per_task):
+    """
+    Fill the database with lists of tasks and child tasks.
+    :return: The total number of rows created.
+    """
+    from todo_list.models import ToDoList, ParentTask, ChildTask
+
+    due_date = datetime(2018, 4, 20, 12)
+    completed_date = due_date - timedelta(days=1)
+    rows = 0
+
+    for list_number in range(list_count):
+        todo_list = ToDoList.objects.create(list_name='List %d' % list_number,
+                                            list_description='Things I need to do, part %d' % list_number)
+        tasks = ParentTask.objects.bulk_create([
+            ParentTask(todo_list_id=todo_list, task_name='Task %d' % task_number,
+                       task_description='Make a little love, get down tonight.', task_due_date=due_date,
+                       task_completed_date=completed_date if task_number % 2 else None)
+            for task_number in range(tasks_per_list)
+        ])
+        # bulk_create does not set primary keys on every backend, so read them back.
+        task_ids = ParentTask.objects.filter(todo_list_id=todo_list).values_list('id', flat=True)
+        children = [
+            ChildTask(parent_task_id_id=task_id, child_task_name='Child task %d' % child_number,
+                      child_task_description='swing yer partner round and round', child_task_due_date=due_date)
+            for task_id in task_ids for child_number in range(children_per_task)
+        ]
+        ChildTask.objects.bulk_create(children)
+        rows += 1 + len(tasks) + len(children)
+
+    return rows
+
+
+def timed(function, *args, **kwargs):
+    """
+    :return: Tuple of the function's result and the wall-clock seconds it took.
+    """
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def report(title, header, rows):
+    """
+    Print a table of results.
+    """
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print()
+    print(title)
+    print('  '.join(str(cell).ljust(width) for cell, width in zip(header, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in rows:
+        print('  '.join(str(cell).ljust(width) for cell, width in zip(row, widths)))
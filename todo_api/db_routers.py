@@ -0,0 +1,159 @@
+"""
+todo_api.db_routers.py
+
+Database routers.
+See framework documentation: https://docs.djangoproject.com/en/1.11/topics/db/multi-db/#automatic-database-routing
+
+Django asks a router which database to use for each query, but tells it nothing about the request being served.
+ReplicaRoutingMiddleware (todo_api.middleware) therefore records, per thread, the replica the current request may
+read from, if any; ReplicaRouter consults that. Likewise, the viewsets record which shard holds the records a
+request is about (see todo_list.views.ShardMixin); ShardRouter consults that.
+"""
+
+from __future__ import unicode_literals
+
+import random
+import threading
+from contextlib import contextmanager
+from django.apps import apps
+from django.conf import settings
+
+_routing_state = threading.local()
+
+
+def set_read_from_replica(enabled):
+    """
+    Allow or forbid reads from the replicas for the rest of the current thread's request.
+    When allowed, one replica is picked at random for the whole request: replicas lag behind the primary by different
+    amounts, so reading some records from one and related records from another could mix two points in time.
+    :param enabled: Boolean, True/False, reads may go to a replica.
+    :return: None
+    """
+    replicas = settings.DATABASE_REPLICAS
+    _routing_state.replica = random.choice(replicas) if enabled and replicas else None
+
+
+def read_replica():
+    """
+    :return: Alias of the replica the current thread's reads go to, or None if they go to the primary.
+    """
+    return getattr(_routing_state, 'replica', None)
+
+
+def sharding_enabled():
+    """
+    :return: Boolean, True/False, lists are spread over several databases (settings.DATABASE_SHARDS).
+    """
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def shard_aliases():
+    """
+    :return: The aliases of the shards, or [None] when sharding is disabled, None standing for the database the
+    routers would pick anyway; e.g. for looping over the shards with QuerySet.using() or use_shard().
+    """
+    return list(settings.DATABASE_SHARDS) if sharding_enabled() else [None]
+
+
+def shard_for_id(record_id):
+    """
+    The records of a list's hierarchy are all given IDs congruent, modulo the number of shards, to the index of the
+    shard holding the list (see todo_list.models.ShardedModel), so any of their IDs tells where they all are.
+    :param record_id: ID of a list, task or child task.
+    :return: Alias of the shard holding the record.
+    """
+    return settings.DATABASE_SHARDS[record_id % len(settings.DATABASE_SHARDS)]
+
+
+def owning_shard(record_id):
+    """
+    :param record_id: ID of a list, task or child task.
+    :return: Alias of the shard holding the record, or None when sharding is disabled; e.g. for use_shard().
+    """
+    return shard_for_id(record_id) if sharding_enabled() else None
+
+
+def set_current_shard(alias):
+    """
+    Route the queries on sharded models to a shard for the rest of the current thread's request.
+    :param alias: Alias of the shard, or None for the first shard.
+    :return: None
+    """
+    _routing_state.shard = alias
+
+
+def current_shard():
+    """
+    :return: Alias of the shard the current thread's queries on sharded models go to, or None for the first shard.
+    """
+    return getattr(_routing_state, 'shard', None)
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Route the queries on sharded models made in a block of code to a shard, e.g. in management commands and workers.
+    :param alias: Alias of the shard, or None for the first shard.
+    """
+    previous = current_shard()
+    set_current_shard(alias)
+    try:
+        yield
+    finally:
+        set_current_shard(previous)
+
+
+class ShardRouter(object):
+    """
+    Sends every query on a sharded model (one with a true `sharded` attribute) to the shard holding its records,
+    when settings.DATABASE_SHARDS names more than one database: the database a model instance was read from, or
+    failing that the current thread's shard (see set_current_shard), or failing that the first shard.
+    Queries on other models are left to the next router. Other models' tables are only created on the first shard.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not (getattr(model, 'sharded', False) and sharding_enabled()):
+            return None
+
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_SHARDS:
+            return instance._state.db
+        return current_shard() or settings.DATABASE_SHARDS[0]
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The shards after the first only hold the sharded models' tables. Migrations pass historical models, which
+        # lack the `sharded` attribute, so the current model is looked up.
+        if db not in settings.DATABASE_SHARDS[1:]:
+            return None
+        try:
+            return model_name is not None and getattr(apps.get_model(app_label, model_name), 'sharded', False)
+        except LookupError:
+            return False
+
+
+class ReplicaRouter(object):
+    """
+    Sends reads to the replica picked at random from settings.DATABASE_REPLICAS for the current request, when it
+    allows it (see set_read_from_replica), and everything else to the "default" (primary) database.
+
+    Outside a request (management commands, background job workers) and during requests that write, every query
+    goes to the primary, so a request always reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_replica() or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold copies of the primary's rows, so relations between them are always valid.
+        databases = set(['default'] + list(settings.DATABASE_REPLICAS))
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
@@ -0,0 +1,258 @@
+"""
+todo_api.middleware.py
+
+Project middleware.
+See framework documentation: https://docs.djangoproject.com/en/1.11/topics/http/middleware/
+"""
+
+from __future__ import unicode_literals
+
+import re
+import zlib
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from todo_api.db_routers import set_read_from_replica
+from todo_api.profiling import UNPROFILED_PATHS, RequestProfiler, has_profiling_token, save_profile, should_sample
+
+# Content types worth compressing: JSON, MessagePack, Arrow and text formats. Already-compressed formats are left alone.
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'application/msgpack', 'application/vnd.',
+                              'application/xml', 'text/')
+
+# Requests with these methods do not modify data, so their reads may be served by a replica.
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+class GzipCompressor(object):
+    """
+    Incremental gzip compression, wrapping zlib.
+    """
+
+    def __init__(self):
+        # wbits 31: gzip container, 32KB window.
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor(object):
+    """
+    Incremental brotli compression. Requires the optional `brotli` package.
+    """
+
+    def __init__(self):
+        import brotli
+        # Quality 4 compresses much better than gzip at a similar speed; the higher qualities are too slow to use
+        # on every response.
+        self._compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor(object):
+    """
+    Incremental Zstandard compression. Requires the optional `zstandard` package.
+    """
+
+    def __init__(self):
+        import zstandard
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+COMPRESSORS = {
+    'gzip': GzipCompressor,
+    'br': BrotliCompressor,
+    'zstd': ZstdCompressor,
+}
+
+_available_encodings = None
+
+
+def available_encodings():
+    """
+    The content codings this server can produce, in order of preference (settings.COMPRESSION_ENCODINGS), leaving
+    out those whose optional package is not installed. The optional packages are only imported on first use.
+    :return: Tuple of content coding names.
+    """
+    global _available_encodings
+
+    if _available_encodings is None:
+        encodings = []
+        for encoding in settings.COMPRESSION_ENCODINGS:
+            try:
+                COMPRESSORS[encoding]()
+            except ImportError:
+                continue
+            encodings.append(encoding)
+        _available_encodings = tuple(encodings)
+
+    return _available_encodings
+
+
+@receiver(setting_changed)
+def reset_available_encodings(setting, **kwargs):
+    """
+    Forget the available codings when settings.COMPRESSION_ENCODINGS is overridden (e.g. in tests).
+    """
+    global _available_encodings
+
+    if setting == 'COMPRESSION_ENCODINGS':
+        _available_encodings = None
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Pick the content coding to respond with.
+    :param accept_encoding: The request's Accept-Encoding header.
+    :param encodings: The codings available, in order of the server's preference.
+    :return: The coding the client accepts with the highest quality value (the server's preference breaking ties),
+    or None if the client accepts none of them.
+    """
+    qualities = {}
+    for coding, quality in ACCEPT_ENCODING_RE.findall(accept_encoding.lower()):
+        try:
+            qualities[coding] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses with gzip, brotli or Zstandard, as negotiated through the request's Accept-Encoding header.
+
+    Responses smaller than settings.COMPRESSION_MIN_SIZE bytes are sent as they are, since compression gains little
+    on them. Streaming responses are compressed chunk by chunk as they are sent. A strong ETag is made weak, since
+    the compressed body is no longer byte-for-byte the one it was computed for; it still matches If-None-Match.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        # From here on, the response depends on the request's Accept-Encoding.
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), available_encodings())
+        if encoding is None:
+            return response
+
+        compressor = COMPRESSORS[encoding]()
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(compressor, response.streaming_content)
+            # The compressed length is not known up front.
+            del response['Content-Length']
+        else:
+            compressed = compressor.compress(response.content) + compressor.flush()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def compress_stream(compressor, chunks):
+        """
+        :return: A generator compressing the chunks of a streaming response.
+        """
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Lets requests that only read data be served from the read replicas (see todo_api.db_routers.ReplicaRouter).
+
+    Replicas lag behind the primary, so a client that has just written would not necessarily see its own write on
+    a replica. Any request that may write therefore sets a short-lived cookie (settings.DATABASE_REPLICA_PIN_COOKIE,
+    lasting settings.DATABASE_REPLICA_PIN_SECONDS); while the client sends it back, its reads stay on the primary.
+    """
+
+    def process_request(self, request):
+        pinned = settings.DATABASE_REPLICA_PIN_COOKIE in request.COOKIES
+        set_read_from_replica(request.method in SAFE_METHODS and not pinned)
+
+    def process_response(self, request, response):
+        set_read_from_replica(False)
+
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS:
+            response.set_cookie(settings.DATABASE_REPLICA_PIN_COOKIE, '1',
+                                max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True)
+        return response
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles requests on demand (see todo_api.profiling), for the profiles endpoint to serve.
+
+    A request is profiled when it carries an X-Profile header holding settings.PROFILING_TOKEN, in which case its
+    profile is always kept and its ID returned in an X-Profile-Id response header. Besides, requests are picked at
+    random at settings.PROFILING_SAMPLE_RATE, and their profile is kept if they took settings.PROFILING_SLOW_MS or
+    longer. Requests that are not profiled only pay for a path check, a header lookup and, when sampling, a random
+    number. Requests to the profiles endpoint itself are never profiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info.startswith(UNPROFILED_PATHS):
+            return self.get_response(request)
+
+        if has_profiling_token(request):
+            trigger = 'header'
+        elif should_sample():
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+
+        profiler = RequestProfiler()
+        response = profiler.run(self.get_response, request)
+
+        if trigger == 'header' or 1000 * profiler.duration >= settings.PROFILING_SLOW_MS:
+            profile_id = save_profile(profiler, request, response, trigger)
+            if trigger == 'header':
+                response['X-Profile-Id'] = profile_id
+        return response
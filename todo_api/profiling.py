@@ -0,0 +1,220 @@
+"""
+todo_api.profiling.py
+
+Request profiling, used by ProfilingMiddleware (todo_api.middleware) and the profiles endpoint.
+
+A profiled request runs under cProfile while every SQL query it makes is timed. The result is stored in
+settings.PROFILING_DIR as two files named after the profile's ID: the cProfile statistics in pstats format (<id>.prof)
+and a JSON summary of the request and its queries (<id>.json). Only the most recent settings.PROFILING_KEEP profiles
+are kept.
+
+Query parameters are not recorded, so that customer data does not end up in the profiles.
+"""
+
+from __future__ import division, unicode_literals
+
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{14}-[0-9a-f]{8}$')
+
+# Requests to the profiles endpoint carry the profiling token too, but profiling them would only crowd out the
+# profiles worth keeping.
+UNPROFILED_PATHS = ('/v1/profiles/',)
+
+
+class RequestProfiler(object):
+    """
+    Profiles a function call with cProfile and times the SQL queries it makes on every database connection.
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.queries = []
+        self.duration = None
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Execute wrapper timing a query. See https://docs.djangoproject.com/en/2.2/topics/db/instrumentation/
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'alias': context['connection'].alias,
+                                 'sql': sql,
+                                 'many': many,
+                                 'duration_ms': round(1000 * (time.perf_counter() - started), 3)})
+
+    def run(self, function, *args):
+        """
+        :param function: The function to profile.
+        :return: The function's result.
+        """
+        with ExitStack() as wrappers:
+            for connection in connections.all():
+                wrappers.enter_context(connection.execute_wrapper(self.record_query))
+            started = time.perf_counter()
+            try:
+                return self.profile.runcall(profiled_call, function, *args)
+            finally:
+                self.duration = time.perf_counter() - started
+
+
+def profiled_call(function, *args):
+    """
+    The root of every profile's call graph. Django's middleware functions call each other recursively, so without it
+    the graph would have no function that nothing calls to start from.
+    """
+    return function(*args)
+
+
+def has_profiling_token(request):
+    """
+    :param request: A request.
+    :return: Boolean, True/False, the request carries settings.PROFILING_TOKEN in its X-Profile header.
+    """
+    token = request.META.get('HTTP_X_PROFILE')
+    return bool(token and settings.PROFILING_TOKEN and constant_time_compare(token, settings.PROFILING_TOKEN))
+
+
+def should_sample():
+    """
+    :return: Boolean, True/False, a request picked at random at settings.PROFILING_SAMPLE_RATE should be profiled.
+    """
+    return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def profile_path(profile_id, extension):
+    """
+    :param profile_id: ID of a stored profile.
+    :param extension: "prof" for the pstats file, "json" for the summary.
+    :return: Path of one of the profile's files.
+    """
+    return os.path.join(settings.PROFILING_DIR, '%s.%s' % (profile_id, extension))
+
+
+def save_profile(profiler, request, response, trigger):
+    """
+    Store a profile, and prune the oldest ones beyond settings.PROFILING_KEEP.
+    :param profiler: The RequestProfiler which profiled the request.
+    :param request: The profiled request.
+    :param response: Its response.
+    :param trigger: What made the request profiled: "header" or "sample".
+    :return: ID of the stored profile.
+    """
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    now = datetime.now()
+    profile_id = '%s-%s' % (now.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+
+    profiler.profile.dump_stats(profile_path(profile_id, 'prof'))
+    summary = {
+        'id': profile_id,
+        'profile_date': now.isoformat(),
+        'trigger': trigger,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(1000 * profiler.duration, 3),
+        'query_count': len(profiler.queries),
+        'query_duration_ms': round(sum(query['duration_ms'] for query in profiler.queries), 3),
+        'queries': profiler.queries,
+    }
+    with io.open(profile_path(profile_id, 'json'), 'w', encoding='utf-8') as summary_file:
+        json.dump(summary, summary_file)
+
+    for stale_id in list_profile_ids()[settings.PROFILING_KEEP:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(profile_path(stale_id, extension))
+            except OSError:
+                pass
+
+    return profile_id
+
+
+def list_profile_ids():
+    """
+    :return: IDs of the stored profiles, most recent first.
+    """
+    paths = glob.glob(os.path.join(settings.PROFILING_DIR, '*.json'))
+    profile_ids = [os.path.basename(path)[:-len('.json')] for path in paths]
+    return sorted((profile_id for profile_id in profile_ids if PROFILE_ID_RE.match(profile_id)), reverse=True)
+
+
+def load_summary(profile_id):
+    """
+    :param profile_id: ID of a stored profile.
+    :return: Dict of the profile's summary, or None if there is no such profile.
+    """
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with io.open(profile_path(profile_id, 'json'), encoding='utf-8') as summary_file:
+            return json.load(summary_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def collapsed_stacks(stats, min_microseconds=1):
+    """
+    Convert cProfile statistics to collapsed stacks ("root;caller;callee microseconds" lines), the input format of
+    flame graph tools such as flamegraph.pl and speedscope.
+
+    cProfile only records which function called which, not whole stacks. Stacks are rebuilt by walking the call
+    graph down from the functions nobody called, sharing each function's time out among the stacks leading to it
+    in proportion to the time spent in calls along each one. Recursive calls are folded into their first occurrence.
+    :param stats: A pstats.Stats object.
+    :param min_microseconds: Stacks taking less time than this are left out.
+    :return: Generator of lines.
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, cumulative))
+
+    def label(function):
+        filename, line, name = function
+        return '%s:%d:%s' % (os.path.basename(filename), line, name) if line else name
+
+    def walk(function, stack, share):
+        _, _, own_time, cumulative, _ = stats.stats[function]
+        fraction = share / cumulative if cumulative else 0.0
+        stack = stack + [label(function)]
+
+        microseconds = int(round(1e6 * own_time * fraction))
+        if microseconds >= min_microseconds:
+            yield '%s %d' % (';'.join(stack), microseconds)
+
+        for callee, callee_cumulative in callees.get(function, ()):
+            if label(callee) not in stack and callee_cumulative * fraction * 1e6 >= min_microseconds:
+                for line in walk(callee, stack, callee_cumulative * fraction):
+                    yield line
+
+    for function, (_, _, _, cumulative, callers) in stats.stats.items():
+        if not callers:
+            for line in walk(function, [], cumulative):
+                yield line
+
+
+def load_stats(profile_id):
+    """
+    :param profile_id: ID of a stored profile.
+    :return: The profile's pstats.Stats, or None if there is no such profile.
+    """
+    if not PROFILE_ID_RE.match(profile_id) or not os.path.exists(profile_path(profile_id, 'prof')):
+        return None
+    return pstats.Stats(profile_path(profile_id, 'prof'), stream=io.StringIO())
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,7 +43,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'todo_api.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'todo_api.middleware.CompressionMiddleware',
+    'todo_api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +86,52 @@ DATABASES = {
     }
 }
 
+# Read replicas
+# GET requests read from a randomly chosen alias in DATABASE_REPLICAS; everything else uses "default", the primary.
+# After a client writes, its reads stay on the primary for DATABASE_REPLICA_PIN_SECONDS, so it sees its own writes.
+# See todo_api.db_routers.
+#
+# To try this locally with two SQLite files, copy db.sqlite3 to db_replica.sqlite3 (standing in for replication)
+# and add:
+#
+#     DATABASES['replica'] = {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['todo_api.db_routers.ShardRouter', 'todo_api.db_routers.ReplicaRouter']
+
+DATABASE_REPLICAS = []
+
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+DATABASE_REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Shards
+# With more than one alias in DATABASE_SHARDS, each list is stored, together with its tasks and child tasks (archived
+# or not), on one of these databases, chosen at random when the list is created; "default" must be the first. Other
+# records (background jobs, users...) stay on "default", and replicas are not used for sharded records.
+# See todo_api.db_routers.ShardRouter.
+#
+# A record's ID tells which shard holds it, so sharding must be enabled on empty databases, and the number of shards
+# cannot be changed once lists are stored: rows written before would not be found. The database system checks (run by
+# migrate and `manage.py check --tag database`) report such rows as error todo_list.E001. There is no command to move
+# them.
+#
+# To try this locally, set the TODO_API_SHARDS environment variable to the number of shards wanted: the extra shards
+# are SQLite files next to db.sqlite3. Create their tables with `python manage.py migrate --database shard1` etc.
+
+DATABASE_SHARDS = ['default']
+
+for shard_number in range(1, int(os.environ.get('TODO_API_SHARDS', '1'))):
+    DATABASES['shard%d' % shard_number] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_shard%d.sqlite3' % shard_number),
+    }
+    DATABASE_SHARDS.append('shard%d' % shard_number)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -120,3 +170,118 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/1.11/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Background jobs
+# When enabled, cascading task completions and list deletions are queued and processed in chunks by worker processes
+# (`python manage.py process_jobs`). The API then responds with 202 Accepted and the URL of the job's status resource.
+
+TODO_LIST_BACKGROUND_JOBS = False
+
+TODO_LIST_JOB_CHUNK_SIZE = 1000
+
+# Seconds after which a running job is presumed abandoned by a dead worker and queued again. Must be longer than the
+# longest job takes.
+TODO_LIST_JOB_TIMEOUT = 3600
+
+
+# Large deletions
+# Deleting a list removes its child tasks, tasks and finally the list itself in batches of this many rows, each batch
+# in its own transaction.
+
+TODO_LIST_DELETE_BATCH_SIZE = 1000
+
+
+# Caches
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# The "throttle" cache holds the API's rate limiting buckets, one per client and scope. It must be shared by all worker
+# processes for the limits to hold. In production, point TODO_API_THROTTLE_MEMCACHED at Memcached ("host:port", or
+# several separated by commas; requires the `python-memcached` package).
+# Otherwise a file-based cache is used, for development and single-host setups. It is not meant for many clients:
+# past MAX_ENTRIES buckets it deletes a third of them at random, resetting those clients' limits, and every write
+# lists the whole cache directory. Keep MAX_ENTRIES well above three times the number of clients expected.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+if os.environ.get('TODO_API_THROTTLE_MEMCACHED'):
+    CACHES['throttle'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ['TODO_API_THROTTLE_MEMCACHED'].split(','),
+    }
+else:
+    CACHES['throttle'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'todo_api_throttle'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+TODO_LIST_THROTTLE_CACHE = 'throttle'
+
+
+# Django REST Framework
+# http://www.django-rest-framework.org/api-guide/settings/
+# Token bucket throttles (see todo_list.throttling): every client is limited per IP address ("anon") or per user
+# ("user"), and gets stricter buckets for the nested lists endpoint ("nested_list") and for writes ("write").
+# Anonymous clients are told apart by IP address. NUM_PROXIES is the number of reverse proxies in front of the
+# application (TODO_API_NUM_PROXIES): the client's address is then the one the outermost proxy added to the
+# X-Forwarded-For header. With 0, the header is ignored; left unset, DRF would take the whole header, which clients
+# can set to anything and so get a fresh bucket with every request.
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': (
+        'todo_list.throttling.AnonBucketThrottle',
+        'todo_list.throttling.UserBucketThrottle',
+        'todo_list.throttling.EndpointBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '300/min',
+        'user': '1200/min',
+        'nested_list': '30/min',
+        'write': '120/min',
+    },
+    'NUM_PROXIES': int(os.environ.get('TODO_API_NUM_PROXIES', '0')),
+}
+
+
+# Response compression
+# Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with the first coding in COMPRESSION_ENCODINGS that
+# the client accepts. Brotli ("br") and Zstandard ("zstd") require the optional `brotli` and `zstandard` packages;
+# codings whose package is missing are skipped.
+
+COMPRESSION_MIN_SIZE = 1024
+
+COMPRESSION_ENCODINGS = ('zstd', 'br', 'gzip')
+
+
+# Batch requests
+# Maximum number of sub-requests in one request to /v1/batch/.
+
+TODO_LIST_BATCH_MAX_REQUESTS = 50
+
+
+# Archival
+# `python manage.py archive_tasks` moves tasks completed more than this many days ago, with their child tasks, into
+# the archive tables. The tasks endpoints only include archived tasks when asked to with ?include_archived=1.
+
+TODO_LIST_ARCHIVE_AFTER_DAYS = 90
+
+
+# Request profiling
+# A request is profiled (see todo_api.profiling) when it carries an "X-Profile: <PROFILING_TOKEN>" header, or at random
+# at PROFILING_SAMPLE_RATE (0 to 1), in which case its profile is only kept if it took PROFILING_SLOW_MS or longer.
+# Profiles are stored in PROFILING_DIR, which only holds the latest PROFILING_KEEP, and served by /v1/profiles/ to
+# staff users and to requests carrying the token. An empty token disables the header.
+
+PROFILING_TOKEN = os.environ.get('TODO_API_PROFILING_TOKEN', '')
+
+PROFILING_SAMPLE_RATE = 0.0
+
+PROFILING_SLOW_MS = 500
+
+PROFILING_DIR = os.path.join(tempfile.gettempdir(), 'todo_api_profiles')
+
+PROFILING_KEEP = 100
@@ -0,0 +1,46 @@
+"""
+todo_api.settings_api.py
+
+Settings for API-only deployments, which start faster than the full settings in todo_api.settings.
+
+This service is a pure JSON API, so this profile leaves out everything the API does not use: the admin, auth,
+sessions, messages and static files apps, their middleware (including CSRF, which only protects session-authenticated
+browsers), the template engine and the browsable API, and translations. Requests are unauthenticated, as they are in
+the full settings, and are rate limited by IP address.
+
+Serve it through todo_api.wsgi_api, e.g.:
+
+    gunicorn todo_api.wsgi_api
+"""
+
+from todo_api.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'todo_list',
+]
+
+MIDDLEWARE = [
+    'todo_api.middleware.ProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'todo_api.middleware.CompressionMiddleware',
+    'todo_api.middleware.ReplicaRoutingMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'todo_api.urls_api'
+
+TEMPLATES = []
+
+WSGI_APPLICATION = 'todo_api.wsgi_api.application'
+
+AUTH_PASSWORD_VALIDATORS = []
+
+# The API only speaks English; skipping translations saves loading the message catalogs.
+USE_I18N = False
+
+REST_FRAMEWORK = dict(REST_FRAMEWORK, **{  # noqa: F405
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+    'DEFAULT_PARSER_CLASSES': ('rest_framework.parsers.JSONParser',),
+    'DEFAULT_AUTHENTICATION_CLASSES': (),
+    'UNAUTHENTICATED_USER': None,
+})
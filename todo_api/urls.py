@@ -2,7 +2,7 @@
 todo_api.urls.py
 Implementation commit: Paul Anderson, 3/25/2018
 
-Set up Django routers to define API endpoint URIs
+Set up Django routers to define API endpoint URIs (see todo_api.urls_api), plus the browsable API's login views
 
 todo_api URL Configuration
 
@@ -20,15 +20,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
 from django.conf.urls import url, include
-from rest_framework import routers
-from todo_list import views
+from todo_api.urls_api import urlpatterns as api_urlpatterns
 
-router = routers.DefaultRouter()
-router.register(r'v1/lists', views.TodoListTaskViewSet)
-router.register(r'v1/tasks', views.ParentTaskViewSet)
-router.register(r'v1/child_tasks', views.ChildTaskViewSet)
-
-urlpatterns = [
-    url(r'^', include(router.urls)),
+urlpatterns = api_urlpatterns + [
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework'))
 ]
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""
+todo_api.urls_api.py
+
+URL configuration of the API itself: the Django REST Framework router's endpoint URIs, and the batch endpoint.
+This is the whole URLconf of the API-only deployment (todo_api.settings_api); todo_api.urls adds the browsable API's
+login views to it.
+"""
+from django.conf.urls import url, include
+from rest_framework import routers
+from todo_list import views
+
+router = routers.DefaultRouter()
+router.register(r'v1/lists', views.TodoListTaskViewSet)
+router.register(r'v1/tasks', views.ParentTaskViewSet)
+router.register(r'v1/child_tasks', views.ChildTaskViewSet)
+router.register(r'v1/jobs', views.BackgroundJobViewSet)
+router.register(r'v1/profiles', views.ProfileViewSet, base_name='profile')
+
+urlpatterns = [
+    url(r'^', include(router.urls)),
+    url(r'^v1/batch/$', views.BatchView.as_view(), name='batch'),
+]
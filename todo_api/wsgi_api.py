@@ -0,0 +1,38 @@
+"""
+WSGI config for API-only deployments of todo_api (see todo_api.settings_api).
+
+It exposes the WSGI callable as a module-level variable named ``application``.
+
+Django imports the URLconf, the views and the serializers, and compiles the URL patterns, on the first request. Here
+that is done once at startup instead, so that a freshly started worker answers its first request as fast as the
+others.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "todo_api.settings_api")
+
+application = get_wsgi_application()
+
+
+def warm_up():
+    """
+    Import the URLconf and everything it refers to, and compile the URL patterns for resolving and reversing.
+    """
+    from django.urls import get_resolver
+
+    def compile_patterns(resolver):
+        for pattern in resolver.url_patterns:
+            getattr(pattern, 'pattern', pattern).regex
+            if hasattr(pattern, 'url_patterns'):
+                compile_patterns(pattern)
+
+    resolver = get_resolver()
+    compile_patterns(resolver)
+    # Build the reverse lookup tables used to generate the "url" fields of responses.
+    resolver.reverse_dict
+
+
+warm_up()
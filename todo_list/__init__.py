@@ -0,0 +1 @@
+default_app_config = 'todo_list.apps.TodoListConfig'
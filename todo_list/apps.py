@@ -6,3 +6,7 @@ from django.apps import AppConfig
 
 class TodoListConfig(AppConfig):
     name = 'todo_list'
+
+    def ready(self):
+        # Register the system checks.
+        from todo_list import checks  # noqa: F401
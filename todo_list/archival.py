@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.archival.py
+
+Archival of completed tasks, used by the `archive_tasks` management command.
+
+Completed tasks otherwise stay in the ParentTask and ChildTask tables forever, slowing down every scan of them.
+Tasks completed more than a given number of days ago are moved, together with all their child tasks, into the
+ArchivedParentTask and ArchivedChildTask tables, keeping their IDs. Tasks are moved in batches, each batch copied and
+deleted in one transaction, so a task is always in exactly one of the two tables and the write lock is only held for
+one batch at a time. Child tasks are copied in batches of the same size, so a task with a huge number of child tasks
+does not have to fit in memory either.
+"""
+
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from django.db import router, transaction
+from todo_list.deletion import delete_batch
+from todo_list.models import ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask
+
+
+def _copy_rows(queryset, archive_model, archived_date_field, archived_date):
+    """
+    Copy rows into an archive table, which has the same columns plus an archival date.
+    :param queryset: The rows to copy.
+    :param archive_model: The archive table's model.
+    :param archived_date_field: Name of the archive table's archival date column.
+    :param archived_date: Archival date to set.
+    :return: The primary keys of the copied rows.
+    """
+    columns = [field.attname for field in queryset.model._meta.concrete_fields]
+    rows = [dict(zip(columns, values)) for values in queryset.values_list(*columns)]
+
+    archive_model.objects.using(queryset.db).bulk_create([
+        archive_model(**dict(row, **{archived_date_field: archived_date})) for row in rows
+    ])
+    return [row['id'] for row in rows]
+
+
+def archive_completed_tasks(older_than_days, batch_size):
+    """
+    Move tasks completed more than older_than_days ago, with their child tasks, into the archive tables.
+    :param older_than_days: Minimum age of a task's completion date, in days.
+    :param batch_size: Maximum number of tasks (and of child tasks) copied at a time.
+    :return: A generator yielding, for each batch, the numbers of tasks and of child tasks archived.
+    """
+    archived_date = datetime.now()
+    cutoff = archived_date - timedelta(days=older_than_days)
+    using = router.db_for_write(ParentTask)
+    completed_tasks = ParentTask.objects.using(using).filter(task_completed_date__lt=cutoff).order_by('id')
+
+    while True:
+        with transaction.atomic(using=using):
+            task_ids = _copy_rows(completed_tasks[:batch_size], ArchivedParentTask, 'task_archived_date',
+                                  archived_date)
+            if not task_ids:
+                break
+
+            child_count = 0
+            child_tasks = ChildTask.objects.using(using).filter(parent_task_id__in=task_ids).order_by('id')
+            while True:
+                child_ids = _copy_rows(child_tasks[:batch_size], ArchivedChildTask, 'child_task_archived_date',
+                                       archived_date)
+                if not child_ids:
+                    break
+                delete_batch(ChildTask, child_ids, using)
+                child_count += len(child_ids)
+
+            delete_batch(ParentTask, task_ids, using)
+        yield len(task_ids), child_count
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.checks.py
+
+System checks.
+See framework documentation: https://docs.djangoproject.com/en/2.2/topics/checks/
+
+check_shard_ids reads every sharded table, so it is tagged as a database check: it only runs before migrations and
+on demand with `python manage.py check --tag database`, not on every manage.py command.
+
+When lists are sharded, a record's ID must tell which shard holds it (see todo_api.db_routers.shard_for_id). Rows
+written before sharding was enabled, or before the number of shards changed, keep IDs that point elsewhere: the API
+would not find them. Rather than serve such a database, check_shard_ids reports it as an error.
+"""
+
+from __future__ import unicode_literals
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.db import DatabaseError
+from django.db.models.functions import Mod
+from todo_api.db_routers import sharding_enabled
+
+
+@checks.register(checks.Tags.database)
+def check_shard_ids(app_configs=None, **kwargs):
+    """
+    :return: List of errors, one per shard and sharded table holding rows whose ID points to another shard.
+    """
+    if not sharding_enabled():
+        return []
+
+    shards = settings.DATABASE_SHARDS
+    sharded_models = [model for model in apps.get_app_config('todo_list').get_models()
+                      if getattr(model, 'sharded', False)]
+    errors = []
+
+    for index, alias in enumerate(shards):
+        for model in sharded_models:
+            if model._meta.pk.name != 'id':
+                continue
+            try:
+                misplaced = (model.objects.using(alias).annotate(shard_index=Mod('id', len(shards)))
+                             .exclude(shard_index=index).exists())
+            except DatabaseError:
+                # The table does not exist yet: the shard has not been migrated.
+                continue
+            if misplaced:
+                errors.append(checks.Error(
+                    'The %s table on the "%s" shard holds rows whose ID does not map to that shard.'
+                    % (model._meta.db_table, alias),
+                    hint='Sharding can only be enabled on empty databases, and the number of shards cannot be changed '
+                         'once lists are stored. See DATABASE_SHARDS in settings.py.',
+                    obj=model,
+                    id='todo_list.E001',
+                ))
+
+    return errors
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.deletion.py
+
+Batched deletion of a ToDoList and everything in it.
+
+Deleting a list with `instance.delete()` makes Django's collector load every related task and child task (archived
+or not) into memory to emulate ON DELETE CASCADE, and deletes them all in one transaction. For big lists that means a
+memory spike and a long-held write lock. Here the hierarchy is deleted bottom-up (child tasks, then tasks, archived
+ones first, then the list) in batches of primary keys, each batch in its own short transaction, so peak memory is
+bounded by the batch size and no batch ever leaves orphaned rows behind.
+
+Rows are removed with a single raw DELETE per batch unless something listens for pre_delete/post_delete on the
+model; in that case the batch goes through the collector so that the listeners still fire for every row.
+"""
+
+from __future__ import unicode_literals
+
+from django.db import router, transaction
+from django.db.models import signals
+from todo_list.models import ToDoList, ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask
+
+
+def has_delete_listeners(model):
+    """
+    :param model: A model class.
+    :return: Boolean, True/False, a pre_delete or post_delete receiver is connected for the model.
+    """
+    return signals.pre_delete.has_listeners(model) or signals.post_delete.has_listeners(model)
+
+
+def delete_batch(model, ids, using):
+    """
+    Delete a batch of rows by primary key, with a raw DELETE when no delete signal receivers need to see them.
+    The caller is responsible for having deleted any rows that cascade from these ones first.
+    :param model: The model of the rows.
+    :param ids: Primary keys of the rows.
+    :param using: Database alias.
+    :return: None
+    """
+    batch = model.objects.using(using).filter(pk__in=ids)
+    if has_delete_listeners(model):
+        batch.delete()
+    else:
+        batch._raw_delete(using)
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Delete the rows of a queryset in batches.
+    The caller is responsible for having deleted any rows that cascade from these ones first.
+    :param queryset: The rows to delete.
+    :param batch_size: Maximum number of rows deleted per batch.
+    :return: A generator yielding the number of rows deleted by each batch.
+    """
+    using = router.db_for_write(queryset.model)
+
+    while True:
+        with transaction.atomic(using=using):
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            delete_batch(queryset.model, ids, using)
+        yield len(ids)
+
+
+def list_deletion_querysets(todo_list_id):
+    """
+    :param todo_list_id: ID of a ToDoList.
+    :return: The querysets making up the list's hierarchy, in the order they must be deleted.
+    """
+    return [
+        ArchivedChildTask.objects.filter(parent_task_id__todo_list_id__exact=todo_list_id),
+        ArchivedParentTask.objects.filter(todo_list_id__exact=todo_list_id),
+        ChildTask.objects.filter(parent_task_id__todo_list_id__exact=todo_list_id),
+        ParentTask.objects.filter(todo_list_id__exact=todo_list_id),
+        ToDoList.objects.filter(id__exact=todo_list_id),
+    ]
+
+
+def delete_list_in_batches(todo_list_id, batch_size):
+    """
+    Delete a list, its tasks and their child tasks in bounded batches.
+    :param todo_list_id: ID of the ToDoList to delete.
+    :param batch_size: Maximum number of rows deleted per batch.
+    :return: A generator yielding the number of rows deleted by each batch.
+    """
+    for queryset in list_deletion_querysets(todo_list_id):
+        for deleted in delete_in_batches(queryset, batch_size):
+            yield deleted
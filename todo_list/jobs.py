@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.jobs.py
+
+A small database-backed job queue for work that is too heavy to perform inside a request.
+
+Cascading completion of a ParentTask with thousands of ChildTask rows, and deletion of a large ToDoList, hold the
+request (and, on SQLite, the database write lock) for as long as the cascade takes. When background jobs are enabled
+(settings.TODO_LIST_BACKGROUND_JOBS), the views queue a BackgroundJob record instead, and worker processes started
+with `python manage.py process_jobs` perform the cascade in chunks of settings.TODO_LIST_JOB_CHUNK_SIZE rows.
+
+Each chunk is committed in its own transaction together with the job's progress counter, so the write lock is only
+held for one chunk at a time and the job endpoint always reports how far along the work is.
+
+A worker that dies mid-job leaves it running. Jobs started more than settings.TODO_LIST_JOB_TIMEOUT seconds ago and
+still running are put back in the queue, to be started over by another worker; the handlers only ever work on what
+is left to do, so a job can safely be run again.
+"""
+
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import router, transaction
+from todo_api.db_routers import owning_shard, use_shard
+from todo_list.deletion import delete_list_in_batches, list_deletion_querysets
+from todo_list.models import ParentTask, ChildTask, BackgroundJob
+
+# Maps each job type to the generator function that performs it; see job_handler below.
+JOB_HANDLERS = {}
+
+
+def job_handler(job_type):
+    """
+    Decorator registering a function as the handler for a job type.
+    A handler is a generator taking the job and a chunk size. It should set job.total_items before doing any work,
+    then process the job in chunks, yielding the number of items processed by each chunk.
+    :param job_type: One of the BackgroundJob job type constants.
+    :return: The decorator.
+    """
+    def register(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return register
+
+
+def background_jobs_enabled():
+    """
+    :return: Boolean, True/False, heavy cascades should be queued rather than performed inline.
+    """
+    return settings.TODO_LIST_BACKGROUND_JOBS
+
+
+def enqueue_job(job_type, target_id):
+    """
+    Queue a job for the worker processes.
+    :param job_type: One of the BackgroundJob job type constants.
+    :param target_id: The ID of the record the job operates on.
+    :return: The new BackgroundJob record.
+    """
+    return BackgroundJob.objects.create(job_type=job_type, target_id=target_id)
+
+
+def claim_next_job():
+    """
+    Claim the oldest pending job for this worker.
+    The claim is a conditional UPDATE, so when several workers race for the same job exactly one of them wins.
+    :return: The claimed BackgroundJob record, or None if no job is pending.
+    """
+    pending_ids = BackgroundJob.objects.filter(status=BackgroundJob.PENDING).order_by('id').values_list('id', flat=True)
+
+    for job_id in pending_ids[:10]:
+        claimed = BackgroundJob.objects.filter(id__exact=job_id, status=BackgroundJob.PENDING).update(
+            status=BackgroundJob.RUNNING, job_started_date=datetime.now())
+        if claimed:
+            return BackgroundJob.objects.get(pk=job_id)
+
+    return None
+
+
+def requeue_stale_jobs():
+    """
+    Put back in the queue the jobs that have been running for longer than settings.TODO_LIST_JOB_TIMEOUT seconds,
+    presumably because their worker died. Their progress is reset, since they start over.
+    :return: The number of jobs requeued.
+    """
+    cutoff = datetime.now() - timedelta(seconds=settings.TODO_LIST_JOB_TIMEOUT)
+    return BackgroundJob.objects.filter(status=BackgroundJob.RUNNING, job_started_date__lt=cutoff).update(
+        status=BackgroundJob.PENDING, job_started_date=None, total_items=None, processed_items=0)
+
+
+def run_job(job):
+    """
+    Perform a claimed job chunk by chunk, recording progress after each chunk.
+    A failing job, or one of an unknown type, is marked as failed with the error message; it is not retried.
+    :param job: A BackgroundJob record in the running state.
+    :return: The job, in its final state.
+    """
+    # The job is recorded on the default database, but the records it works on are on the shard its target's ID
+    # points to. Each chunk is then committed there just before its progress is.
+    shard = owning_shard(job.target_id)
+
+    try:
+        if job.job_type not in JOB_HANDLERS:
+            raise ValueError('Unknown job type: %s' % job.job_type)
+        steps = JOB_HANDLERS[job.job_type](job, settings.TODO_LIST_JOB_CHUNK_SIZE)
+
+        while True:
+            # Commit each chunk of work together with the progress counter.
+            with use_shard(shard), transaction.atomic(), transaction.atomic(using=router.db_for_write(ChildTask)):
+                processed = next(steps, None)
+                if processed is None:
+                    break
+                job.processed_items += processed
+                job.save(update_fields=['total_items', 'processed_items'])
+    except Exception as e:
+        job.status = BackgroundJob.FAILED
+        job.error_message = str(e)[:1000]
+    else:
+        job.status = BackgroundJob.COMPLETED
+
+    job.job_completed_date = datetime.now()
+    job.save(update_fields=['total_items', 'processed_items', 'status', 'error_message', 'job_completed_date'])
+    return job
+
+
+def run_pending_jobs(max_jobs=None):
+    """
+    Claim and run pending jobs until the queue is empty, stale running jobs included.
+    :param max_jobs: Optional limit on the number of jobs to run.
+    :return: The number of jobs run.
+    """
+    requeue_stale_jobs()
+    jobs_run = 0
+
+    while max_jobs is None or jobs_run < max_jobs:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        jobs_run += 1
+
+    return jobs_run
+
+
+def _chunked_ids(queryset, chunk_size):
+    """
+    Fetch the primary keys of the first chunk of a queryset.
+    Handlers call this repeatedly on a queryset whose rows drop out of it as they are processed, so only one chunk
+    of IDs is held in memory at a time.
+    """
+    return list(queryset.order_by('id').values_list('id', flat=True)[:chunk_size])
+
+
+@job_handler(BackgroundJob.COMPLETE_TASK)
+def complete_task_children(job, chunk_size):
+    """
+    Mark the incomplete child tasks of a completed parent task complete, using the parent's completion date.
+    """
+    completed_datetime = ParentTask.objects.filter(id__exact=job.target_id).values_list(
+        'task_completed_date', flat=True).first()
+    incomplete_tasks = ChildTask.objects.filter(parent_task_id__exact=job.target_id,
+                                                child_task_completed_date__isnull=True)
+
+    if completed_datetime is None:
+        # The parent task was deleted (or re-opened) before the job ran; there is nothing to cascade.
+        job.total_items = 0
+        return
+
+    job.total_items = incomplete_tasks.count()
+
+    while True:
+        ids = _chunked_ids(incomplete_tasks, chunk_size)
+        if not ids:
+            break
+        ChildTask.objects.filter(id__in=ids).update(child_task_completed_date=completed_datetime)
+        yield len(ids)
+
+
+@job_handler(BackgroundJob.DELETE_LIST)
+def delete_list(job, chunk_size):
+    """
+    Delete a list with its tasks and child tasks, children first so that no chunk leaves orphans behind.
+    """
+    job.total_items = sum(queryset.count() for queryset in list_deletion_querysets(job.target_id))
+
+    for deleted in delete_list_in_batches(job.target_id, chunk_size):
+        yield deleted
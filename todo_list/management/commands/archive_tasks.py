@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.management.commands.archive_tasks.py
+
+Move tasks completed more than N days ago, with their child tasks, into the archive tables (see todo_list.archival).
+Meant to be run periodically, e.g. nightly from cron:
+
+    python manage.py archive_tasks --days 90
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from todo_api.db_routers import shard_aliases, use_shard
+from todo_list.archival import archive_completed_tasks
+
+
+class Command(BaseCommand):
+    help = 'Archive tasks completed more than a given number of days ago, together with their child tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TODO_LIST_ARCHIVE_AFTER_DAYS,
+                            help='Archive tasks completed more than this many days ago (default: %d).'
+                                 % settings.TODO_LIST_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Tasks moved per transaction (default: 1000).')
+
+    def handle(self, *args, **options):
+        task_count = child_count = 0
+
+        # Each shard archives its own tasks.
+        for alias in shard_aliases():
+            with use_shard(alias):
+                for tasks_archived, child_tasks_archived in archive_completed_tasks(options['days'],
+                                                                                    options['batch_size']):
+                    task_count += tasks_archived
+                    child_count += child_tasks_archived
+
+        self.stdout.write('Archived %d tasks and %d child tasks' % (task_count, child_count))
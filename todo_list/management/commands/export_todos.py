@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.management.commands.export_todos.py
+
+Stream every list, task and child task to NDJSON or CSV (see todo_list.transfer for the record format).
+
+    python manage.py export_todos --output todos.ndjson
+    python manage.py export_todos --format csv > todos.csv
+"""
+
+from __future__ import unicode_literals
+
+import io
+import time
+from django.core.management.base import BaseCommand
+from todo_list.transfer import FORMATS, export_records, write_records
+
+
+def guess_format(path):
+    """
+    :param path: A file path, or None.
+    :return: "csv" for paths ending in .csv, otherwise "ndjson".
+    """
+    return 'csv' if path and path.lower().endswith('.csv') else 'ndjson'
+
+
+class Command(BaseCommand):
+    help = 'Export all lists, tasks and child tasks as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write to (default: standard output).')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Output format (default: csv for .csv files, otherwise ndjson).')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database cursor at a time (default: 2000).')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['output'])
+        started = time.time()
+
+        records = export_records(chunk_size=options['chunk_size'])
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                count = write_records(records, stream, fmt)
+        else:
+            count = write_records(records, self.stdout, fmt)
+
+        elapsed = time.time() - started
+        self.stderr.write('Exported %d records in %.2fs (%d records/s)' % (count, elapsed, count / max(elapsed, 1e-6)))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.management.commands.import_todos.py
+
+Import lists, tasks and child tasks from NDJSON or CSV written by export_todos (see todo_list.transfer).
+Imported rows are added alongside the existing data under new IDs; the import is all-or-nothing.
+
+    python manage.py import_todos todos.ndjson
+    python manage.py import_todos --format csv - < todos.csv
+"""
+
+from __future__ import unicode_literals
+
+import io
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from todo_api.db_routers import sharding_enabled
+from todo_list.management.commands.export_todos import guess_format
+from todo_list.transfer import FORMATS, import_records, read_records
+
+
+class Command(BaseCommand):
+    help = 'Import lists, tasks and child tasks from NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read from, or "-" for standard input.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: csv for .csv files, otherwise ndjson).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per bulk insert (default: 1000).')
+
+    def handle(self, *args, **options):
+        if sharding_enabled():
+            raise CommandError('Importing is not supported when lists are sharded over several databases.')
+
+        fmt = options['format'] or guess_format(options['input'])
+        started = time.time()
+
+        if options['input'] == '-':
+            stream = sys.stdin
+        else:
+            stream = io.open(options['input'], 'r', encoding='utf-8', newline='')
+
+        try:
+            counts = import_records(read_records(stream, fmt), batch_size=options['batch_size'])
+        except (KeyError, TypeError, ValueError, IntegrityError) as e:
+            raise CommandError('Import failed, nothing was imported: %s' % e)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        count = sum(counts.values())
+        elapsed = time.time() - started
+        self.stdout.write('Imported %d lists, %d tasks and %d child tasks in %.2fs (%d records/s)' % (
+            counts['list'], counts['task'], counts['child_task'], elapsed, count / max(elapsed, 1e-6)))
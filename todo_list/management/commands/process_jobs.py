@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.management.commands.process_jobs.py
+
+Worker process for the background job queue (see todo_list.jobs).
+Start as many workers as needed; each one claims pending jobs independently.
+
+    python manage.py process_jobs            # poll for jobs until interrupted
+    python manage.py process_jobs --once     # drain the queue and exit
+"""
+
+from __future__ import unicode_literals
+
+import time
+from django.core.management.base import BaseCommand
+from todo_list.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued background jobs (cascading task completions and list deletions).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are currently pending, then exit.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait before polling an empty queue again (default: 1).')
+
+    def handle(self, *args, **options):
+        while True:
+            jobs_run = run_pending_jobs()
+            if jobs_run:
+                self.stdout.write('Processed %d job(s)' % jobs_run)
+            if options['once']:
+                break
+            if not jobs_run:
+                time.sleep(options['poll_interval'])
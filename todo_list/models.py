@@ -12,12 +12,80 @@ Think of each class as a table in a SQL database, and each of the variables decl
 """
 
 from __future__ import unicode_literals
-from django.db import models
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import F
+from todo_api.db_routers import sharding_enabled
 
 # Create your models here.
 
 
-class ToDoList(models.Model):
+class ShardSequence(models.Model):
+    """
+    Each record holds the last ID number handed out for a sharded table, on one shard.
+    """
+    sharded = True
+
+    table_name = models.CharField(max_length=100, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def next_id(cls, model, using):
+        """
+        Allocate an ID for a new record of a sharded table, congruent to the shard's index modulo the number of shards.
+        :param model: The model of the record.
+        :param using: Alias of the shard the record is created on.
+        :return: The ID.
+        """
+        sequences = cls.objects.using(using)
+        shards = settings.DATABASE_SHARDS
+
+        with transaction.atomic(using=using):
+            if not sequences.filter(table_name=model._meta.db_table).exists():
+                # Start above the IDs already in use on the shard, e.g. by rows written before sharding was enabled.
+                max_id = max(table.objects.using(using).aggregate(max_id=models.Max('id'))['max_id'] or 0
+                             for table in model.id_tables())
+                sequences.get_or_create(table_name=model._meta.db_table,
+                                        defaults={'last_value': max_id // len(shards)})
+            sequences.filter(table_name=model._meta.db_table).update(last_value=F('last_value') + 1)
+            value = sequences.values_list('last_value', flat=True).get(table_name=model._meta.db_table)
+
+        return value * len(shards) + shards.index(using)
+
+
+class ShardedModel(models.Model):
+    """
+    Base class of the models whose records are spread over the shards, each list with its whole hierarchy.
+    When sharding is enabled, new records are given an ID from their shard's ShardSequence rather than by the
+    database, so that their ID tells which shard holds them (see todo_api.db_routers.shard_for_id).
+    """
+    sharded = True
+
+    # Name of the model whose records take IDs from this one's, if any: the archive table rows are moved to.
+    archive_model_name = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def id_tables(cls):
+        """
+        :return: The models whose IDs are drawn from this model's sequence: this one, and its archive table's.
+        """
+        if cls.archive_model_name is None:
+            return [cls]
+        return [cls, cls._meta.apps.get_model(cls._meta.app_label, cls.archive_model_name)]
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and sharding_enabled():
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            self.pk = ShardSequence.next_id(type(self), using)
+            # The ID is new, so there is no row to try to update first.
+            kwargs['force_insert'] = True
+        super(ShardedModel, self).save(*args, **kwargs)
+
+
+class ToDoList(ShardedModel):
     """
     Each record represents a list of things to do.
     """
@@ -26,27 +94,98 @@ class ToDoList(models.Model):
     list_description = models.CharField(max_length=1000)
 
 
-class ParentTask(models.Model):
+class ParentTask(ShardedModel):
     """
     Each record represents a task nested within a todo list.
     Note that the "list" field is a foreign key to ToDoList.
     """
 
+    archive_model_name = 'ArchivedParentTask'
+
     todo_list_id = models.ForeignKey(ToDoList, related_name='tasks', on_delete=models.CASCADE)
     task_name = models.CharField(max_length=50)
     task_description = models.CharField(max_length=1000)
     task_due_date = models.DateTimeField(null=False)
-    task_completed_date = models.DateTimeField(null=True)
+    task_completed_date = models.DateTimeField(null=True, db_index=True)
 
 
-class ChildTask(models.Model):
+class ChildTask(ShardedModel):
     """
     Each record represents a task that is a sub-task of a ParentTask record.
     Note that parent_task is a foreign key to ParentTask.
     """
 
+    archive_model_name = 'ArchivedChildTask'
+
     parent_task_id = models.ForeignKey(ParentTask, related_name='child_tasks', on_delete=models.CASCADE)
     child_task_name = models.CharField(max_length=50)
     child_task_description = models.CharField(max_length=1000)
     child_task_due_date = models.DateTimeField(null=False)
     child_task_completed_date = models.DateTimeField(null=True)
+
+
+class ArchivedParentTask(ShardedModel):
+    """
+    Each record represents a completed ParentTask moved out of the ParentTask table by the archive_tasks command,
+    keeping its original ID. Archived tasks are read-only.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    todo_list_id = models.ForeignKey(ToDoList, related_name='archived_tasks', on_delete=models.CASCADE)
+    task_name = models.CharField(max_length=50)
+    task_description = models.CharField(max_length=1000)
+    task_due_date = models.DateTimeField(null=False)
+    task_completed_date = models.DateTimeField(null=True)
+    task_archived_date = models.DateTimeField()
+
+
+class ArchivedChildTask(ShardedModel):
+    """
+    Each record represents a ChildTask archived together with its parent task, keeping its original ID.
+    Note that parent_task is a foreign key to ArchivedParentTask.
+    """
+
+    id = models.IntegerField(primary_key=True)
+    parent_task_id = models.ForeignKey(ArchivedParentTask, related_name='child_tasks', on_delete=models.CASCADE)
+    child_task_name = models.CharField(max_length=50)
+    child_task_description = models.CharField(max_length=1000)
+    child_task_due_date = models.DateTimeField(null=False)
+    child_task_completed_date = models.DateTimeField(null=True)
+    child_task_archived_date = models.DateTimeField()
+
+
+class BackgroundJob(models.Model):
+    """
+    Each record represents a unit of heavy work (a cascading task completion or a large list deletion) that has been
+    queued for a worker process instead of being performed inside the request.
+    Workers claim pending jobs, process them in chunks and record their progress here, so that clients can poll
+    the job endpoint for status.
+    """
+
+    COMPLETE_TASK = 'complete_task'
+    DELETE_LIST = 'delete_list'
+    JOB_TYPE_CHOICES = (
+        (COMPLETE_TASK, 'Complete task'),
+        (DELETE_LIST, 'Delete list'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    )
+
+    job_type = models.CharField(max_length=50, choices=JOB_TYPE_CHOICES)
+    target_id = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    total_items = models.IntegerField(null=True)
+    processed_items = models.IntegerField(default=0)
+    error_message = models.CharField(max_length=1000, blank=True, default='')
+    job_created_date = models.DateTimeField(auto_now_add=True)
+    job_started_date = models.DateTimeField(null=True)
+    job_completed_date = models.DateTimeField(null=True)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.renderers.py
+
+Compact response formats, extending Django REST Framework's renderers API.
+See framework documentation: http://www.django-rest-framework.org/api-guide/renderers/
+
+Clients choose a format with the Accept header (or the ?format= query parameter):
+
+* application/msgpack (format=msgpack): the usual response data, encoded as MessagePack.
+* application/vnd.todo.columnar+json (format=columnar): a collection as one array per field, see CompactFormatsMixin in
+  todo_list.views.
+* application/vnd.apache.arrow.stream (format=arrow): the same columns as an Apache Arrow IPC stream.
+
+MessagePack and Arrow require the optional `msgpack` and `pyarrow` packages. A renderer whose package is missing is
+not offered, so requests for its format are refused with 406 Not Acceptable. The packages are only imported when a
+response is first rendered in their format, so that they do not slow down the start of every worker.
+"""
+
+from __future__ import unicode_literals
+
+from importlib.util import find_spec
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_installed_packages = {}
+
+
+def package_installed(name):
+    """
+    :param name: Name of a top-level package.
+    :return: Boolean, True/False, the package can be imported. Its modules are not imported.
+    """
+    if name not in _installed_packages:
+        _installed_packages[name] = find_spec(name) is not None
+    return _installed_packages[name]
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders response data as MessagePack. Values JSON has no type for (dates, decimals, UUIDs...) are encoded the
+    way the JSON renderer encodes them.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    columnar = False
+
+    @staticmethod
+    def is_available():
+        return package_installed('msgpack')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    Renders a collection laid out in columns (see CompactFormatsMixin in todo_list.views) as JSON.
+    """
+    media_type = 'application/vnd.todo.columnar+json'
+    format = 'columnar'
+    columnar = True
+
+    @staticmethod
+    def is_available():
+        return True
+
+
+class ArrowRenderer(BaseRenderer):
+    """
+    Renders a collection laid out in columns (see CompactFormatsMixin in todo_list.views) as an Apache Arrow IPC stream
+    holding a single record batch. The other top-level values of the data are stored in the schema's metadata.
+    """
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+    columnar = True
+
+    @staticmethod
+    def is_available():
+        return package_installed('pyarrow')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import pyarrow
+        import pyarrow.ipc
+
+        if data is None:
+            return b''
+
+        columns = data['columns']
+        metadata = dict((key, JSONRenderer().render(value)) for key, value in data.items() if key != 'columns')
+        batch = pyarrow.RecordBatch.from_arrays([pyarrow.array(column) for column in columns.values()],
+                                                names=list(columns))
+        batch = batch.replace_schema_metadata(metadata)
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+
+COMPACT_RENDERERS = (MessagePackRenderer, ColumnarJSONRenderer, ArrowRenderer)
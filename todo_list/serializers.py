@@ -7,11 +7,40 @@ See framework documentation: http://www.django-rest-framework.org/api-guide/seri
 Performs JSON serialization and deserialization to interface the API views with the underlying data model.
 
 """
-from todo_list.models import ToDoList, ParentTask, ChildTask
+from django.conf import settings
+from todo_list.models import ToDoList, ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask, BackgroundJob
 from rest_framework import serializers
 
 
-class ChildTaskSerializer(serializers.ModelSerializer):
+class UpdateFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Extends the DRF ModelSerializer class so that updates only write the columns whose value actually changed, with
+    `save(update_fields=...)`, and write nothing at all when no value changed.
+    After `save()`, `changed_fields` lists the names of the fields that were written.
+    """
+    changed_fields = ()
+
+    def update(self, instance, validated_data):
+        changed_fields = []
+
+        for name, value in validated_data.items():
+            field = instance._meta.get_field(name)
+            if field.is_relation:
+                # Compare primary keys, which does not need the current related record to be loaded.
+                current, new = getattr(instance, field.attname), getattr(value, 'pk', value)
+            else:
+                current, new = getattr(instance, name), value
+            if current != new:
+                setattr(instance, name, value)
+                changed_fields.append(name)
+
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+        self.changed_fields = changed_fields
+        return instance
+
+
+class ChildTaskSerializer(UpdateFieldsModelSerializer):
     """
     Extends the DRF ModelSerializer class to provide a custom serializer for "todo" tasks that are children of a
     parent task
@@ -42,7 +71,7 @@ class ParentTaskCompletionSerializer(serializers.Serializer):
     task_id = serializers.IntegerField()
 
 
-class ParentTaskSerializer(serializers.ModelSerializer):
+class ParentTaskSerializer(UpdateFieldsModelSerializer):
 
     # DRF provides for nested serializers
     child_tasks = ChildTaskSerializer(many=True, read_only=True)
@@ -60,7 +89,38 @@ class ParentTaskSerializer(serializers.ModelSerializer):
                   )
 
 
-class TodoListSerializer(serializers.ModelSerializer):
+class ArchivedHyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+    """
+    Links an archived record to its resource URI, which only finds archived records with ?include_archived=1.
+    """
+
+    def get_url(self, obj, view_name, request, format):
+        url = super(ArchivedHyperlinkedIdentityField, self).get_url(obj, view_name, request, format)
+        return url + '?include_archived=1' if url else url
+
+
+class ArchivedChildTaskSerializer(ChildTaskSerializer):
+    """
+    Read-only serializer for archived child tasks, with the same fields as live ones.
+    """
+    url = ArchivedHyperlinkedIdentityField(view_name='childtask-detail')
+
+    class Meta(ChildTaskSerializer.Meta):
+        model = ArchivedChildTask
+
+
+class ArchivedParentTaskSerializer(ParentTaskSerializer):
+    """
+    Read-only serializer for archived tasks, with the same fields as live ones.
+    """
+    url = ArchivedHyperlinkedIdentityField(view_name='parenttask-detail')
+    child_tasks = ArchivedChildTaskSerializer(many=True, read_only=True)
+
+    class Meta(ParentTaskSerializer.Meta):
+        model = ArchivedParentTask
+
+
+class TodoListSerializer(UpdateFieldsModelSerializer):
     """
     Extends the DRF ModelSerializer class representing a to-do list.
     """
@@ -74,3 +134,67 @@ class TodoListSerializer(serializers.ModelSerializer):
                   'list_description',
                   'tasks'
                   )
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    """
+    Reports the status and progress of a queued background job.
+    """
+    progress = serializers.SerializerMethodField()
+
+    def get_progress(self, job):
+        """
+        :param job: A BackgroundJob record.
+        :return: Percentage of the job's items processed so far, or None if the job has not been started.
+        """
+        if job.total_items is None:
+            return None
+        if job.total_items == 0:
+            return 100.0
+        return round(100.0 * job.processed_items / job.total_items, 1)
+
+    class Meta:
+        model = BackgroundJob
+        fields = ('url',
+                  'id',
+                  'job_type',
+                  'target_id',
+                  'status',
+                  'total_items',
+                  'processed_items',
+                  'progress',
+                  'error_message',
+                  'job_created_date',
+                  'job_started_date',
+                  'job_completed_date',
+                  )
+
+
+class BatchSubRequestSerializer(serializers.Serializer):
+    """
+    One sub-request of a batch request: the method, path and optional JSON body of an API call.
+    """
+    method = serializers.ChoiceField(choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'))
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    A special Serializer subclass for batch requests: an ordered array of sub-requests, optionally to be performed
+    in a single transaction.
+    """
+    requests = BatchSubRequestSerializer(many=True)
+    atomic = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        """
+        :param value: The validated list of sub-requests.
+        :return: The sub-requests, if there are at least one and no more than settings.TODO_LIST_BATCH_MAX_REQUESTS.
+        """
+        if not value:
+            raise serializers.ValidationError('A batch needs at least one request.')
+        if len(value) > settings.TODO_LIST_BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                'A batch may hold at most %d requests.' % settings.TODO_LIST_BATCH_MAX_REQUESTS)
+        return value
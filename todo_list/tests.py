@@ -1,15 +1,87 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from todo_list.models import ToDoList, ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask, BackgroundJob
+from todo_list.checks import check_shard_ids
+from todo_list.jobs import run_pending_jobs
+from todo_list.throttling import TokenBucketThrottle
 from todo_list.views import ParentTaskViewSet, ChildTaskViewSet
+import base64
+import gzip
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import router
+from django.db.models import signals
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from todo_api.db_routers import shard_for_id, use_shard
+from todo_api.middleware import CompressionMiddleware, ReplicaRoutingMiddleware
+from todo_api.profiling import list_profile_ids, load_summary
 from rest_framework.response import Response
 from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
-from datetime import datetime
+from datetime import datetime, timedelta
+from unittest import mock
 
 # Create your tests here.
 
-class TodoListViewSetTestCase(APITestCase):
+
+def days_ago(days):
+    """
+    :return: The datetime the given number of days ago.
+    """
+    return datetime.now() - timedelta(days=days)
+
+
+# The tests keep their rate limiting buckets in memory, rather than in the cache shared with local servers.
+TEST_CACHES = dict(settings.CACHES, **{settings.TODO_LIST_THROTTLE_CACHE: {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'todo_api_test_throttle',
+}})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TodoAPITestCase(APITestCase):
+    """
+    Base class for the API tests. Empties the rate limiting buckets, held in memory, before each test, so that every
+    test starts with its full allowance of requests. The tests may use every database, so that they can also be run
+    with the lists sharded (see todo_api.db_routers.ShardRouter).
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        caches[settings.TODO_LIST_THROTTLE_CACHE].clear()
+
+    def create_list(self, task_count=1, child_count=1, list_name="A List", task_completed_date=None,
+                    child_task_completed_date=None, child_task_description="swing yer partner round and round"):
+        """
+        Create a list holding task_count tasks named "Task 0", "Task 1"..., each with child_count child tasks.
+        Records are saved one by one, so that they are given IDs on the current shard when lists are sharded.
+        :return: The ToDoList record.
+        """
+        todo_list = ToDoList.objects.create(list_name=list_name, list_description="Things I need to do")
+        for task_number in range(task_count):
+            task = ParentTask.objects.create(todo_list_id=todo_list, task_name="Task %d" % task_number,
+                                             task_description="Make a little love, get down tonight.",
+                                             task_due_date=datetime(2018, 4, 20, 12),
+                                             task_completed_date=task_completed_date)
+            for child_number in range(child_count):
+                ChildTask.objects.create(parent_task_id=task, child_task_name="Child task %d" % child_number,
+                                         child_task_description=child_task_description,
+                                         child_task_due_date=datetime(2018, 3, 29, 12),
+                                         child_task_completed_date=child_task_completed_date)
+        return todo_list
+
+
+class TodoListViewSetTestCase(TodoAPITestCase):
 
     def test_create_list(self):
         """
@@ -49,7 +121,7 @@ class TodoListViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
 
 
-class ParentTaskViewSetTestCase(APITestCase):
+class ParentTaskViewSetTestCase(TodoAPITestCase):
 
     def test_create_task(self):
         """
@@ -187,7 +259,7 @@ class ParentTaskViewSetTestCase(APITestCase):
         self.assertIsInstance(response, Response)
 
 
-class ChildTaskViewSetTestCase(APITestCase):
+class ChildTaskViewSetTestCase(TodoAPITestCase):
     """
     Unit tests for the ChildTaskViewSet class.
     """
@@ -406,3 +478,1225 @@ class ChildTaskViewSetTestCase(APITestCase):
         '''Assert'''
         # test method returns a Response object
         self.assertIsInstance(response, Response)
+
+
+@override_settings(TODO_LIST_BACKGROUND_JOBS=True, TODO_LIST_JOB_CHUNK_SIZE=2)
+class BackgroundJobTestCase(TodoAPITestCase):
+    """
+    Unit tests for queueing heavy cascades as background jobs.
+    """
+
+    def test_complete_task_queued(self):
+        """
+        Unit test that completing a task queues the child task cascade and reports its progress.
+        :return: None
+        """
+        '''Arrange'''
+        task = self.create_list(child_count=5).tasks.get()
+
+        '''Act'''
+        close_response = self.client.post('/v1/tasks/complete_task/', {"task_id": task.id}, format='json')
+        queued_job_response = self.client.get(close_response.data['job_url'])
+        jobs_run = run_pending_jobs()
+        finished_job_response = self.client.get(close_response.data['job_url'])
+
+        '''Assert'''
+        # The request was accepted and the job was queued, not run
+        self.assertEqual(close_response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(queued_job_response.data['status'], BackgroundJob.PENDING)
+        # A worker ran the job to completion
+        self.assertEqual(jobs_run, 1)
+        self.assertEqual(finished_job_response.data['status'], BackgroundJob.COMPLETED)
+        self.assertEqual(finished_job_response.data['processed_items'], 5)
+        self.assertEqual(finished_job_response.data['progress'], 100.0)
+        # Every child task was marked complete
+        self.assertFalse(ChildTask.objects.filter(child_task_completed_date__isnull=True).exists())
+
+    def test_delete_list_queued(self):
+        """
+        Unit test that deleting a list queues the cascade, which removes the list and everything in it.
+        :return: None
+        """
+        '''Arrange'''
+        task = self.create_list(child_count=5).tasks.get()
+        list_url = '/v1/lists/' + str(task.todo_list_id_id) + '/'
+
+        '''Act'''
+        delete_response = self.client.delete(list_url)
+        run_pending_jobs()
+        job_response = self.client.get(delete_response.data['job_url'])
+        get_response = self.client.get(list_url)
+
+        '''Assert'''
+        self.assertEqual(delete_response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(job_response.data['status'], BackgroundJob.COMPLETED)
+        self.assertEqual(job_response.data['total_items'], 7)
+        self.assertEqual(get_response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ParentTask.objects.exists())
+        self.assertFalse(ChildTask.objects.exists())
+
+    def test_stale_job_requeued(self):
+        """
+        Unit test that a job left running by a dead worker is run again once it times out, and that a job of an
+        unknown type fails instead of crashing the worker.
+        :return: None
+        """
+        '''Arrange'''
+        task = self.create_list(child_count=3).tasks.get()
+        ParentTask.objects.filter(id=task.id).update(task_completed_date=datetime(2018, 4, 19, 12))
+        stale_job = BackgroundJob.objects.create(job_type=BackgroundJob.COMPLETE_TASK, target_id=task.id,
+                                                 status=BackgroundJob.RUNNING, processed_items=2,
+                                                 job_started_date=datetime.now() - timedelta(hours=2))
+        recent_job = BackgroundJob.objects.create(job_type=BackgroundJob.COMPLETE_TASK, target_id=task.id,
+                                                  status=BackgroundJob.RUNNING, job_started_date=datetime.now())
+        unknown_job = BackgroundJob.objects.create(job_type='reticulate_splines', target_id=task.id)
+
+        '''Act'''
+        with override_settings(TODO_LIST_JOB_TIMEOUT=3600):
+            jobs_run = run_pending_jobs()
+
+        '''Assert'''
+        self.assertEqual(jobs_run, 2)
+        stale_job.refresh_from_db()
+        self.assertEqual(stale_job.status, BackgroundJob.COMPLETED)
+        self.assertEqual(stale_job.processed_items, 3)
+        self.assertEqual(BackgroundJob.objects.get(id=recent_job.id).status, BackgroundJob.RUNNING)
+        unknown_job.refresh_from_db()
+        self.assertEqual(unknown_job.status, BackgroundJob.FAILED)
+        self.assertIn('reticulate_splines', unknown_job.error_message)
+        self.assertFalse(ChildTask.objects.filter(child_task_completed_date__isnull=True).exists())
+
+
+@override_settings(TODO_LIST_DELETE_BATCH_SIZE=3)
+class BatchedListDeletionTestCase(TodoAPITestCase):
+    """
+    Unit tests for deleting large lists in batches.
+    """
+
+    def test_delete_list_leaves_no_orphans(self):
+        """
+        Unit test that deleting a list in batches removes every task and child task of the list, and nothing else.
+        :return: None
+        """
+        '''Arrange'''
+        doomed_list = self.create_list(task_count=4, child_count=5)
+        kept_list = self.create_list(task_count=1, child_count=2)
+
+        '''Act'''
+        delete_response = self.client.delete('/v1/lists/' + str(doomed_list.id) + '/')
+
+        '''Assert'''
+        self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ToDoList.objects.filter(id=doomed_list.id).exists())
+        # No orphaned rows are left behind
+        self.assertFalse(ParentTask.objects.exclude(todo_list_id__in=ToDoList.objects.all()).exists())
+        self.assertFalse(ChildTask.objects.exclude(parent_task_id__in=ParentTask.objects.all()).exists())
+        # The other list was left alone
+        self.assertEqual(ParentTask.objects.filter(todo_list_id=kept_list).count(), 1)
+        self.assertEqual(ChildTask.objects.count(), 2)
+
+    def test_delete_list_fires_delete_signals(self):
+        """
+        Unit test that delete signal receivers still fire for every row when a list is deleted in batches.
+        :return: None
+        """
+        '''Arrange'''
+        todo_list = self.create_list(task_count=2, child_count=4)
+        deleted_child_ids = []
+
+        def record_deletion(sender, instance, **kwargs):
+            deleted_child_ids.append(instance.id)
+
+        signals.post_delete.connect(record_deletion, sender=ChildTask)
+        self.addCleanup(signals.post_delete.disconnect, record_deletion, sender=ChildTask)
+
+        '''Act'''
+        self.client.delete('/v1/lists/' + str(todo_list.id) + '/')
+
+        '''Assert'''
+        self.assertEqual(len(deleted_child_ids), 8)
+        self.assertFalse(ChildTask.objects.exists())
+
+
+@unittest.skipIf(len(settings.DATABASE_SHARDS) > 1, 'Imports are not supported when lists are sharded.')
+class TransferCommandsTestCase(TodoAPITestCase):
+    """
+    Unit tests for the export_todos and import_todos management commands.
+    """
+
+    def export_then_import(self, fmt):
+        """
+        Export the database to a temporary file in the given format, then import the file.
+        :return: None
+        """
+        fd, path = tempfile.mkstemp(suffix='.' + fmt)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        call_command('export_todos', output=path, stderr=io.StringIO())
+        call_command('import_todos', path, stdout=io.StringIO())
+
+    def test_ndjson_round_trip(self):
+        """
+        Unit test that an NDJSON export imports back as a copy of the hierarchy under new IDs.
+        :return: None
+        """
+        '''Arrange'''
+        original_list = self.create_list(list_name="Yet Another List", task_completed_date=datetime(2018, 4, 19, 12),
+                                         child_task_description="swing, yer partner \"round\" and round")
+
+        '''Act'''
+        self.export_then_import('ndjson')
+        imported_list = ToDoList.objects.exclude(id=original_list.id).get()
+        imported_task = imported_list.tasks.get()
+        imported_child = imported_task.child_tasks.get()
+
+        '''Assert'''
+        self.assertEqual(ToDoList.objects.count(), 2)
+        self.assertEqual(imported_list.list_name, "Yet Another List")
+        self.assertEqual(imported_task.task_name, "Task 0")
+        self.assertIsNotNone(imported_task.task_completed_date)
+        self.assertEqual(imported_child.child_task_description, "swing, yer partner \"round\" and round")
+        self.assertIsNone(imported_child.child_task_completed_date)
+
+    def test_csv_round_trip(self):
+        """
+        Unit test that a CSV export imports back as a copy of the hierarchy under new IDs.
+        :return: None
+        """
+        '''Arrange'''
+        original_list = self.create_list(list_name="Yet Another List", task_completed_date=datetime(2018, 4, 19, 12),
+                                         child_task_description="swing, yer partner \"round\" and round")
+
+        '''Act'''
+        self.export_then_import('csv')
+        imported_list = ToDoList.objects.exclude(id=original_list.id).get()
+        imported_task = imported_list.tasks.get()
+        imported_child = imported_task.child_tasks.get()
+
+        '''Assert'''
+        self.assertEqual(ParentTask.objects.count(), 2)
+        self.assertEqual(ChildTask.objects.count(), 2)
+        self.assertEqual(imported_task.task_due_date,
+                         datetime(2018, 4, 20, 12, tzinfo=imported_task.task_due_date.tzinfo))
+        self.assertEqual(imported_child.child_task_description, "swing, yer partner \"round\" and round")
+        self.assertIsNone(imported_child.child_task_completed_date)
+
+
+THROTTLE_TEST_SETTINGS = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={
+    'anon': '100/min',
+    'user': '100/min',
+    'nested_list': '2/min',
+    'write': '3/min',
+})
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_TEST_SETTINGS)
+class ThrottlingTestCase(TodoAPITestCase):
+    """
+    Unit tests for the token bucket throttles.
+    """
+
+    def test_nested_list_bucket(self):
+        """
+        Unit test that the nested lists endpoint has its own bucket, and that refused requests carry Retry-After.
+        :return: None
+        """
+        '''Arrange'''
+        url = '/v1/lists/'
+
+        '''Act'''
+        allowed_responses = [self.client.get(url) for _ in range(2)]
+        throttled_response = self.client.get(url)
+        other_endpoint_response = self.client.get('/v1/tasks/')
+
+        '''Assert'''
+        for response in allowed_responses:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(throttled_response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # One token refills every 30 seconds at 2/min
+        self.assertEqual(throttled_response['Retry-After'], '30')
+        # Other endpoints draw on the client-wide bucket only
+        self.assertEqual(other_endpoint_response.status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_ignored(self):
+        """
+        Unit test that a client cannot get a fresh bucket by sending a different X-Forwarded-For header each time,
+        and that with a proxy in front, clients are told apart by the address the proxy adds.
+        :return: None
+        """
+        '''Arrange'''
+        url = '/v1/lists/'
+        proxied_settings = dict(THROTTLE_TEST_SETTINGS, NUM_PROXIES=1)
+
+        '''Act'''
+        spoofed_responses = [self.client.get(url, HTTP_X_FORWARDED_FOR='10.0.0.%d' % number) for number in range(3)]
+        with override_settings(REST_FRAMEWORK=proxied_settings):
+            # The proxy appends the address it saw; whatever the client sent comes before it.
+            proxied_responses = [self.client.get(url, HTTP_X_FORWARDED_FOR='10.0.0.%d, 192.0.2.1' % number)
+                                 for number in range(3)]
+            other_client_response = self.client.get(url, HTTP_X_FORWARDED_FOR='192.0.2.2')
+
+        '''Assert'''
+        self.assertEqual([response.status_code for response in spoofed_responses],
+                         [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual([response.status_code for response in proxied_responses],
+                         [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(other_client_response.status_code, status.HTTP_200_OK)
+
+    def test_write_bucket_refills(self):
+        """
+        Unit test that writes share a bucket, which refills over time.
+        :return: None
+        """
+        '''Arrange'''
+        url = '/v1/lists/'
+        data = {
+            "list_name": "A List",
+            "list_description": "Things I need to do"
+        }
+        now = 1000000.0
+
+        '''Act'''
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=now):
+            burst_responses = [self.client.post(url, data, format='json') for _ in range(4)]
+        with mock.patch.object(TokenBucketThrottle, 'timer', return_value=now + 20):
+            refilled_response = self.client.post(url, data, format='json')
+            empty_response = self.client.post(url, data, format='json')
+
+        '''Assert'''
+        self.assertEqual([response.status_code for response in burst_responses],
+                         [status.HTTP_201_CREATED] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS])
+        # 20 seconds at 3/min buys one more write
+        self.assertEqual(refilled_response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(empty_response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CompressionMiddlewareTestCase(TodoAPITestCase):
+    """
+    Unit tests for response compression.
+    """
+
+    def test_large_response_gzipped(self):
+        """
+        Unit test that a large response is gzipped for a client accepting gzip, and decompresses to the same JSON.
+        :return: None
+        """
+        '''Arrange'''
+        self.create_list(task_count=20, child_count=0)
+
+        '''Act'''
+        plain_response = self.client.get('/v1/tasks/')
+        gzip_response = self.client.get('/v1/tasks/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        '''Assert'''
+        self.assertFalse(plain_response.has_header('Content-Encoding'))
+        self.assertEqual(gzip_response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', gzip_response['Vary'])
+        self.assertLess(len(gzip_response.content), len(plain_response.content))
+        uncompressed = json.loads(gzip.decompress(gzip_response.content).decode('utf-8'))
+        self.assertEqual([task['id'] for task in uncompressed], [task['id'] for task in plain_response.json()])
+
+    def test_small_response_not_compressed(self):
+        """
+        Unit test that responses below the size threshold are sent uncompressed.
+        :return: None
+        """
+        '''Arrange'''
+        url = '/v1/lists/'
+
+        '''Act'''
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_encoding_negotiated(self):
+        """
+        Unit test that the client's quality values, then the server's preference, decide the coding.
+        :return: None
+        """
+        '''Arrange'''
+        self.create_list(task_count=20, child_count=0)
+
+        '''Act'''
+        preferred_response = self.client.get('/v1/tasks/', HTTP_ACCEPT_ENCODING='gzip, zstd')
+        refused_response = self.client.get('/v1/tasks/', HTTP_ACCEPT_ENCODING='gzip;q=0.5, zstd;q=0')
+
+        '''Assert'''
+        self.assertEqual(preferred_response['Content-Encoding'], 'zstd')
+        self.assertEqual(refused_response['Content-Encoding'], 'gzip')
+
+    def test_streaming_response_compressed(self):
+        """
+        Unit test that streaming responses are compressed chunk by chunk, and that a strong ETag is made weak.
+        :return: None
+        """
+        '''Arrange'''
+        lines = [json.dumps({"type": "list", "id": number}) + '\n' for number in range(100)]
+        response = StreamingHttpResponse(iter(lines), content_type='application/x-ndjson')
+        response['ETag'] = '"abc123"'
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+        '''Act'''
+        response = CompressionMiddleware().process_response(request, response)
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+
+        '''Assert'''
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc123"')
+        self.assertEqual(body, ''.join(lines))
+
+
+@unittest.skipIf(len(settings.DATABASE_SHARDS) > 1, 'Lists are not read from replicas when they are sharded.')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TodoAPITestCase):
+    """
+    Unit tests for routing reads to the read replicas.
+    """
+
+    def route(self, request):
+        """
+        Pass a request through ReplicaRoutingMiddleware, noting where the database router sends reads and writes
+        while it is being served.
+        :return: Tuple of the response, the read database and the write database.
+        """
+        routes = {}
+
+        def get_response(request):
+            routes['read'] = router.db_for_read(ToDoList)
+            routes['write'] = router.db_for_write(ToDoList)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return response, routes['read'], routes['write']
+
+    def test_reads_routed(self):
+        """
+        Unit test that GET requests read from a replica, and that requests that may write use only the primary.
+        :return: None
+        """
+        '''Arrange'''
+        request_factory = RequestFactory()
+
+        '''Act'''
+        get_response, get_read_db, get_write_db = self.route(request_factory.get('/v1/lists/'))
+        post_response, post_read_db, post_write_db = self.route(request_factory.post('/v1/lists/'))
+
+        '''Assert'''
+        self.assertEqual(get_read_db, 'replica')
+        self.assertEqual(get_write_db, 'default')
+        self.assertEqual(post_read_db, 'default')
+        self.assertEqual(post_write_db, 'default')
+        # Only the write pins the client to the primary
+        self.assertNotIn(settings.DATABASE_REPLICA_PIN_COOKIE, get_response.cookies)
+        self.assertIn(settings.DATABASE_REPLICA_PIN_COOKIE, post_response.cookies)
+        # Outside a request, reads go to the primary
+        self.assertEqual(router.db_for_read(ToDoList), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica', 'replica2'])
+    def test_one_replica_per_request(self):
+        """
+        Unit test that all the reads of a request go to the same replica, so that they see the same point in time.
+        :return: None
+        """
+        '''Arrange'''
+        request_factory = RequestFactory()
+        read_dbs = []
+
+        def get_response(request):
+            read_dbs.extend(router.db_for_read(model) for model in (ToDoList, ParentTask, ChildTask))
+            return HttpResponse()
+
+        '''Act'''
+        # A different replica each time one is picked
+        with mock.patch('todo_api.db_routers.random.choice', side_effect=['replica2', 'replica', 'replica2']):
+            ReplicaRoutingMiddleware(get_response)(request_factory.get('/v1/lists/1/'))
+
+        '''Assert'''
+        self.assertEqual(read_dbs, ['replica2'] * 3)
+
+    def test_read_your_writes(self):
+        """
+        Unit test that a client's reads stay on the primary while it holds the cookie set by its last write.
+        :return: None
+        """
+        '''Arrange'''
+        request_factory = RequestFactory()
+        post_response, _, _ = self.route(request_factory.post('/v1/child_tasks/complete_child_task/'))
+        pin_cookie = post_response.cookies[settings.DATABASE_REPLICA_PIN_COOKIE]
+        request_factory.cookies[pin_cookie.key] = pin_cookie.value
+
+        '''Act'''
+        _, pinned_read_db, _ = self.route(request_factory.get('/v1/child_tasks/'))
+
+        '''Assert'''
+        self.assertEqual(pinned_read_db, 'default')
+        self.assertEqual(int(pin_cookie['max-age']), settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+class BatchViewTestCase(TodoAPITestCase):
+    """
+    Unit tests for the batch endpoint.
+    """
+
+    def test_batch(self):
+        """
+        Unit test a batch creating a list, a task and a child task, then completing the child task, with each
+        sub-request referring to the record created by the one before.
+        :return: None
+        """
+        '''Arrange'''
+        batch = {
+            "requests": [
+                {"method": "POST", "path": "/v1/lists/",
+                 "body": {"list_name": "A List", "list_description": "Things I need to do"}},
+                {"method": "POST", "path": "/v1/tasks/",
+                 "body": {"todo_list_id": "{{0.id}}", "task_name": "Do a little dance",
+                          "task_description": "Make a little love, get down tonight.",
+                          "task_due_date": "2018-04-20T12:00:00"}},
+                {"method": "POST", "path": "/v1/child_tasks/",
+                 "body": {"parent_task_id": "{{1.id}}", "child_task_name": "square dance",
+                          "child_task_description": "swing yer partner round and round",
+                          "child_task_due_date": "2018-03-29T12:00:00"}},
+                {"method": "POST", "path": "/v1/child_tasks/complete_child_task/",
+                 "body": {"child_task_id": "{{2.id}}"}},
+                {"method": "GET", "path": "/v1/tasks/{{1.id}}/"},
+            ]
+        }
+
+        '''Act'''
+        response = self.client.post('/v1/batch/', batch, format='json')
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([sub_response['status'] for sub_response in response.data],
+                         [status.HTTP_201_CREATED] * 3 + [status.HTTP_200_OK] * 2)
+        # Completing the only child task completed its parent
+        self.assertIsNotNone(response.data[4]['body']['task_completed_date'])
+
+    def test_atomic_batch_rolled_back(self):
+        """
+        Unit test that an atomic batch stops at the first failing sub-request and rolls back the ones before it.
+        :return: None
+        """
+        '''Arrange'''
+        batch = {
+            "atomic": True,
+            "requests": [
+                {"method": "POST", "path": "/v1/lists/",
+                 "body": {"list_name": "A List", "list_description": "Things I need to do"}},
+                {"method": "POST", "path": "/v1/tasks/", "body": {"todo_list_id": "{{0.id}}"}},
+                {"method": "GET", "path": "/v1/lists/"},
+            ]
+        }
+
+        '''Act'''
+        response = self.client.post('/v1/batch/', batch, format='json')
+
+        '''Assert'''
+        self.assertEqual([sub_response['status'] for sub_response in response.data],
+                         [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST])
+        self.assertFalse(ToDoList.objects.exists())
+
+    def test_invalid_sub_requests(self):
+        """
+        Unit test that unknown paths, nested batches and dangling references fail on their own.
+        :return: None
+        """
+        '''Arrange'''
+        batch = {
+            "requests": [
+                {"method": "GET", "path": "/v1/nothing_here/"},
+                {"method": "POST", "path": "/v1/batch/", "body": {"requests": []}},
+                {"method": "GET", "path": "/v1/lists/{{0.id}}/"},
+                {"method": "GET", "path": "/v1/lists/"},
+                # A field name into an array
+                {"method": "GET", "path": "/v1/lists/{{3.foo}}/"},
+            ]
+        }
+
+        '''Act'''
+        response = self.client.post('/v1/batch/', batch, format='json')
+
+        '''Assert'''
+        self.assertEqual([sub_response['status'] for sub_response in response.data],
+                         [status.HTTP_404_NOT_FOUND, status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST,
+                          status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST])
+
+    @unittest.skipUnless(settings.ROOT_URLCONF == 'todo_api.urls', 'The API-only URLconf has no views outside the API.')
+    def test_non_api_sub_request(self):
+        """
+        Unit test that paths outside the API, here the browsable API's login view, cannot be batched.
+        :return: None
+        """
+        '''Arrange'''
+        batch = {"requests": [{"method": "GET", "path": "/api-auth/login/"}]}
+
+        '''Act'''
+        response = self.client.post('/v1/batch/', batch, format='json')
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['status'], status.HTTP_400_BAD_REQUEST)
+
+
+class ArchivalTestCase(TodoAPITestCase):
+    """
+    Unit tests for archiving completed tasks.
+    """
+
+    def test_archive_tasks(self):
+        """
+        Unit test that only tasks completed long enough ago are archived, along with their child tasks.
+        :return: None
+        """
+        '''Arrange'''
+        old_tasks = list(self.create_list(task_count=3, child_count=2, task_completed_date=days_ago(100),
+                                          child_task_completed_date=days_ago(100)).tasks.all())
+        recent_task = self.create_list(child_count=2, task_completed_date=days_ago(1),
+                                       child_task_completed_date=days_ago(1)).tasks.get()
+        open_task = self.create_list(child_count=2).tasks.get()
+
+        '''Act'''
+        call_command('archive_tasks', days=30, batch_size=2, stdout=io.StringIO())
+
+        '''Assert'''
+        self.assertEqual(set(ParentTask.objects.values_list('id', flat=True)), {recent_task.id, open_task.id})
+        self.assertEqual(set(ArchivedParentTask.objects.values_list('id', flat=True)),
+                         {task.id for task in old_tasks})
+        self.assertEqual(ChildTask.objects.count(), 4)
+        self.assertEqual(ArchivedChildTask.objects.count(), 6)
+        self.assertFalse(
+            ArchivedChildTask.objects.exclude(parent_task_id__in=ArchivedParentTask.objects.all()).exists())
+
+    def test_include_archived(self):
+        """
+        Unit test that the tasks endpoints only show archived tasks when asked to with ?include_archived=1.
+        :return: None
+        """
+        '''Arrange'''
+        archived_task = self.create_list(child_count=2, task_completed_date=days_ago(100),
+                                         child_task_completed_date=days_ago(100)).tasks.get()
+        live_task = self.create_list(child_count=2).tasks.get()
+        call_command('archive_tasks', days=30, stdout=io.StringIO())
+        archived_url = '/v1/tasks/' + str(archived_task.id) + '/'
+
+        '''Act'''
+        hot_response = self.client.get('/v1/tasks/')
+        union_response = self.client.get('/v1/tasks/?include_archived=1')
+        child_union_response = self.client.get('/v1/child_tasks/?include_archived=1')
+        archived_hidden_response = self.client.get(archived_url)
+        archived_response = self.client.get(archived_url + '?include_archived=1')
+
+        '''Assert'''
+        self.assertEqual([task['id'] for task in hot_response.data], [live_task.id])
+        self.assertEqual(sorted(task['id'] for task in union_response.data), [archived_task.id, live_task.id])
+        self.assertEqual(len(child_union_response.data), 4)
+        self.assertEqual(archived_hidden_response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(archived_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(archived_response.data['child_tasks']), 2)
+        self.assertTrue(archived_response.data['url'].endswith(archived_url + '?include_archived=1'))
+
+    @unittest.skipIf(len(settings.DATABASE_SHARDS) > 1, 'Imports are not supported when lists are sharded.')
+    def test_import_after_archive(self):
+        """
+        Unit test that imported tasks get IDs above those of archived tasks, so that they can be archived in turn.
+        :return: None
+        """
+        '''Arrange'''
+        live_tasks = list(self.create_list(task_count=2).tasks.all())
+        archived_tasks = list(self.create_list(task_count=2, task_completed_date=days_ago(100),
+                                               child_task_completed_date=days_ago(100)).tasks.all())
+        call_command('archive_tasks', days=30, stdout=io.StringIO())
+        completed_date = days_ago(100).isoformat()
+        records = [{'type': 'list', 'id': 1, 'name': "Imported List", 'description': "Things"}] + [
+            {'type': 'task', 'id': task_number, 'parent_id': 1, 'name': "Do a little dance",
+             'description': "Make a little love", 'due_date': '2018-04-20T12:00:00', 'completed_date': completed_date}
+            for task_number in (1, 2)]
+        stream = io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+
+        '''Act'''
+        with mock.patch('sys.stdin', stream):
+            call_command('import_todos', '-', stdout=io.StringIO())
+        imported_ids = list(ParentTask.objects.filter(todo_list_id__list_name="Imported List")
+                            .values_list('id', flat=True))
+        call_command('archive_tasks', days=30, stdout=io.StringIO())
+        union_response = self.client.get('/v1/tasks/?include_archived=1')
+
+        '''Assert'''
+        self.assertGreater(min(imported_ids), max(task.id for task in archived_tasks))
+        union_ids = [task['id'] for task in union_response.data]
+        self.assertEqual(sorted(union_ids), sorted(set(union_ids)))
+        self.assertEqual(set(union_ids), {task.id for task in live_tasks + archived_tasks} | set(imported_ids))
+        self.assertEqual(ArchivedParentTask.objects.count(), 4)
+
+    def test_delete_list_with_archived_tasks(self):
+        """
+        Unit test that deleting a list deletes its archived tasks too.
+        :return: None
+        """
+        '''Arrange'''
+        todo_list = self.create_list(child_count=2, task_completed_date=days_ago(100),
+                                     child_task_completed_date=days_ago(100))
+        call_command('archive_tasks', days=30, stdout=io.StringIO())
+
+        '''Act'''
+        delete_response = self.client.delete('/v1/lists/' + str(todo_list.id) + '/')
+
+        '''Assert'''
+        self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ArchivedParentTask.objects.exists())
+        self.assertFalse(ArchivedChildTask.objects.exists())
+
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+
+class CompactFormatsTestCase(TodoAPITestCase):
+    """
+    Unit tests for the MessagePack and columnar response formats.
+    """
+
+    def setUp(self):
+        super(CompactFormatsTestCase, self).setUp()
+        self.todo_list = self.create_list(task_count=3, child_count=0)
+        self.todo_list.tasks.filter(task_name="Task 1").update(task_completed_date=datetime(2018, 4, 19))
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        """
+        Unit test that MessagePack responses hold the same data as JSON ones.
+        :return: None
+        """
+        '''Act'''
+        json_response = self.client.get('/v1/lists/')
+        msgpack_response = self.client.get('/v1/lists/', HTTP_ACCEPT='application/msgpack')
+
+        '''Assert'''
+        self.assertEqual(msgpack_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(msgpack_response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(msgpack_response.content), json.loads(json_response.content.decode('utf-8')))
+
+    def test_columnar_json(self):
+        """
+        Unit test that columnar responses hold one array per field, in the same order as the records.
+        :return: None
+        """
+        '''Act'''
+        with self.assertNumQueries(1):
+            response = self.client.get('/v1/tasks/', HTTP_ACCEPT='application/vnd.todo.columnar+json')
+        data = json.loads(response.content.decode('utf-8'))
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['count'], 3)
+        self.assertIn('request_date', data)
+        self.assertEqual(list(data['columns']), ['id', 'todo_list_id', 'task_name', 'task_description',
+                                                 'task_due_date', 'task_completed_date'])
+        self.assertEqual(data['columns']['task_name'], ["Task 0", "Task 1", "Task 2"])
+        self.assertEqual(data['columns']['todo_list_id'], [self.todo_list.id] * 3)
+        self.assertEqual([date is None for date in data['columns']['task_completed_date']], [True, False, True])
+
+    def test_columnar_list_only(self):
+        """
+        Unit test that only collections are offered in a columnar format, and that errors are reported in JSON.
+        :return: None
+        """
+        '''Arrange'''
+        task_id = ParentTask.objects.first().id
+
+        '''Act'''
+        lists_response = self.client.get('/v1/lists/', HTTP_ACCEPT='application/vnd.todo.columnar+json')
+        detail_response = self.client.get('/v1/tasks/' + str(task_id) + '/?format=columnar')
+        with mock.patch.object(ParentTaskViewSet, 'list_querysets', side_effect=Http404):
+            error_response = self.client.get('/v1/tasks/', HTTP_ACCEPT='application/vnd.todo.columnar+json')
+
+        '''Assert'''
+        self.assertEqual(lists_response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        self.assertEqual(detail_response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(error_response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(error_response['Content-Type'], 'application/json')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        """
+        Unit test that Arrow responses hold the columns as a typed record batch.
+        :return: None
+        """
+        '''Act'''
+        response = self.client.get('/v1/tasks/', HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column('task_name').to_pylist(), ["Task 0", "Task 1", "Task 2"])
+        self.assertTrue(pyarrow.types.is_timestamp(table.schema.field('task_due_date').type))
+        self.assertEqual(table.schema.metadata[b'count'], b'3')
+
+
+@override_settings(ROOT_URLCONF='todo_api.urls_api')
+class ApiOnlyUrlsTestCase(TodoAPITestCase):
+
+    def test_api_only_urls(self):
+        """
+        Unit test that the API-only URLconf serves the API, but not the browsable API's login views.
+        :return: None
+        """
+        '''Arrange'''
+        todo_list = ToDoList.objects.create(list_name="A List", list_description="Things I need to do")
+
+        '''Act'''
+        root_response = self.client.get('/')
+        list_response = self.client.get('/v1/lists/' + str(todo_list.id) + '/')
+        login_response = self.client.get('/api-auth/login/')
+
+        '''Assert'''
+        self.assertEqual(root_response.status_code, status.HTTP_200_OK)
+        self.assertIn('v1/lists', root_response.data)
+        self.assertEqual(list_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list_response.data['list_name'], "A List")
+        self.assertEqual(login_response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(PROFILING_TOKEN='s3cret', PROFILING_SAMPLE_RATE=0.0, PROFILING_SLOW_MS=500, PROFILING_KEEP=100)
+class ProfilingTestCase(TodoAPITestCase):
+    """
+    Unit tests for request profiling and the profiles endpoint.
+    """
+
+    def setUp(self):
+        super(ProfilingTestCase, self).setUp()
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        profile_dir_override = override_settings(PROFILING_DIR=profile_dir)
+        profile_dir_override.enable()
+        self.addCleanup(profile_dir_override.disable)
+
+        self.todo_list = ToDoList.objects.create(list_name="A List", list_description="Things I need to do")
+        self.list_url = '/v1/lists/' + str(self.todo_list.id) + '/'
+
+    def test_profile_on_demand(self):
+        """
+        Unit test that only requests carrying the profiling token are profiled, and that their profile can be read.
+        :return: None
+        """
+        '''Act'''
+        plain_response = self.client.get(self.list_url)
+        wrong_token_response = self.client.get(self.list_url, HTTP_X_PROFILE='guess')
+        profiled_response = self.client.get(self.list_url, HTTP_X_PROFILE='s3cret')
+        profile_id = profiled_response['X-Profile-Id']
+        profile_url = '/v1/profiles/' + profile_id + '/'
+
+        forbidden_response = self.client.get('/v1/profiles/')
+        list_response = self.client.get('/v1/profiles/', HTTP_X_PROFILE='s3cret')
+        detail_response = self.client.get(profile_url, HTTP_X_PROFILE='s3cret')
+        pstats_response = self.client.get(profile_url + 'pstats/', HTTP_X_PROFILE='s3cret')
+        collapsed_response = self.client.get(profile_url + 'collapsed/', HTTP_X_PROFILE='s3cret')
+
+        '''Assert'''
+        self.assertFalse(plain_response.has_header('X-Profile-Id'))
+        self.assertFalse(wrong_token_response.has_header('X-Profile-Id'))
+        self.assertEqual(profiled_response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(forbidden_response.status_code, status.HTTP_403_FORBIDDEN)
+        # Requests to the profiles endpoint are not profiled themselves.
+        self.assertEqual([profile['id'] for profile in list_response.data], [profile_id])
+        self.assertNotIn('queries', list_response.data[0])
+        self.assertEqual(detail_response.data['path'], self.list_url)
+        self.assertEqual(detail_response.data['trigger'], 'header')
+        self.assertEqual(detail_response.data['query_count'], len(detail_response.data['queries']))
+        self.assertTrue(any('todo_list_todolist' in query['sql'] for query in detail_response.data['queries']))
+
+        stats_path = os.path.join(settings.PROFILING_DIR, 'downloaded.prof')
+        with open(stats_path, 'wb') as stats_file:
+            stats_file.write(pstats_response.content)
+        self.assertTrue(pstats.Stats(stats_path, stream=io.StringIO()).total_calls > 0)
+
+        stacks = [stack.rsplit(' ', 1) for stack in collapsed_response.content.decode('utf-8').splitlines()]
+        self.assertTrue(all(int(microseconds) > 0 for _, microseconds in stacks))
+        self.assertTrue(any(frames.startswith('profiling.py:') and ':retrieve;' in frames for frames, _ in stacks))
+
+    def test_batched_binary_profile(self):
+        """
+        Unit test that a binary sub-response body comes back base64-encoded.
+        :return: None
+        """
+        '''Arrange'''
+        profile_id = self.client.get(self.list_url, HTTP_X_PROFILE='s3cret')['X-Profile-Id']
+        batch = {"requests": [{"method": "GET", "path": '/v1/profiles/' + profile_id + '/pstats/'}]}
+
+        '''Act'''
+        response = self.client.post('/v1/batch/', batch, format='json', HTTP_X_PROFILE='s3cret')
+
+        '''Assert'''
+        sub_response = response.data[0]
+        self.assertEqual(sub_response['status'], status.HTTP_200_OK)
+        self.assertEqual(sub_response['body_encoding'], 'base64')
+        stats_path = os.path.join(settings.PROFILING_DIR, 'downloaded.prof')
+        with open(stats_path, 'wb') as stats_file:
+            stats_file.write(base64.b64decode(sub_response['body']))
+        self.assertTrue(pstats.Stats(stats_path, stream=io.StringIO()).total_calls > 0)
+
+    def test_sampled_slow_requests(self):
+        """
+        Unit test that sampled requests are only kept when slow, and that only the latest profiles are kept.
+        :return: None
+        """
+        '''Act'''
+        with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=60000):
+            self.client.get(self.list_url)
+        fast_profile_ids = list_profile_ids()
+        with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=0, PROFILING_KEEP=2):
+            for _ in range(3):
+                self.client.get(self.list_url)
+        slow_profile_ids = list_profile_ids()
+
+        '''Assert'''
+        self.assertEqual(fast_profile_ids, [])
+        self.assertEqual(len(slow_profile_ids), 2)
+        self.assertEqual(load_summary(slow_profile_ids[0])['trigger'], 'sample')
+        self.assertEqual(len(os.listdir(settings.PROFILING_DIR)), 4)
+
+    def test_unknown_profile(self):
+        """
+        Unit test that unknown profile IDs are not found.
+        :return: None
+        """
+        '''Act'''
+        response = self.client.get('/v1/profiles/20180420120000-0123abcd/collapsed/', HTTP_X_PROFILE='s3cret')
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UpdateTestCase(TodoAPITestCase):
+    """
+    Unit tests for PUT and PATCH requests.
+    """
+
+    def setUp(self):
+        super(UpdateTestCase, self).setUp()
+        self.todo_list = self.create_list(task_count=3, child_count=2)
+        self.tasks = list(self.todo_list.tasks.order_by('id'))
+        self.child_tasks = list(self.tasks[0].child_tasks.order_by('id'))
+
+    def test_patch_child_task(self):
+        """
+        Unit test that a PATCH writes only the changed columns, and nothing when no value changed.
+        :return: None
+        """
+        '''Arrange'''
+        child_url = '/v1/child_tasks/' + str(self.child_tasks[0].id) + '/'
+
+        '''Act'''
+        # Read the child task, then update its name.
+        with self.assertNumQueries(2):
+            changed_response = self.client.patch(child_url, {'child_task_name': "Renamed"}, format='json')
+        with self.assertNumQueries(1):
+            unchanged_response = self.client.patch(child_url, {'child_task_name': "Renamed"}, format='json')
+
+        '''Assert'''
+        self.assertEqual(changed_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed_response.data['child_task_name'], "Renamed")
+        self.assertEqual(unchanged_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ChildTask.objects.get(id=self.child_tasks[0].id).child_task_name, "Renamed")
+
+    def test_move_child_task(self):
+        """
+        Unit test that moving a child task to another parent task completes the parent task it leaves, when its
+        remaining child tasks are all complete.
+        :return: None
+        """
+        '''Arrange'''
+        self.child_tasks[0].child_task_completed_date = datetime(2018, 4, 19, 12)
+        self.child_tasks[0].save()
+        moved_url = '/v1/child_tasks/' + str(self.child_tasks[1].id) + '/'
+
+        '''Act'''
+        patch_response = self.client.patch(moved_url, {'parent_task_id': self.tasks[1].id}, format='json')
+
+        '''Assert'''
+        self.assertEqual(patch_response.status_code, status.HTTP_200_OK)
+        # The task left behind only has a completed child task; the one moved to still has incomplete ones.
+        self.assertIsNotNone(ParentTask.objects.get(id=self.tasks[0].id).task_completed_date)
+        self.assertIsNone(ParentTask.objects.get(id=self.tasks[1].id).task_completed_date)
+
+    def test_patch_child_task_completion(self):
+        """
+        Unit test that the parent task is marked complete, in one query, once all its child tasks are.
+        :return: None
+        """
+        '''Arrange'''
+        completion_body = {'child_task_completed_date': '2018-04-19T12:00:00Z'}
+
+        '''Act'''
+        # Read the child task, update its completion date, then roll up the parent's.
+        with self.assertNumQueries(3):
+            self.client.patch('/v1/child_tasks/' + str(self.child_tasks[0].id) + '/', completion_body, format='json')
+        first_completed_date = ParentTask.objects.get(id=self.tasks[0].id).task_completed_date
+        self.client.patch('/v1/child_tasks/' + str(self.child_tasks[1].id) + '/', completion_body, format='json')
+        last_completed_date = ParentTask.objects.get(id=self.tasks[0].id).task_completed_date
+
+        '''Assert'''
+        self.assertIsNone(first_completed_date)
+        self.assertIsNotNone(last_completed_date)
+
+    def test_put_child_task(self):
+        """
+        Unit test that a PUT validates and updates the child task.
+        :return: None
+        """
+        '''Arrange'''
+        child_url = '/v1/child_tasks/' + str(self.child_tasks[0].id) + '/'
+        child_body = {
+            'parent_task_id': self.tasks[1].id,
+            'child_task_name': "Moved",
+            'child_task_description': "swing yer partner round and round",
+            'child_task_due_date': '2018-04-20T12:00:00Z',
+        }
+
+        '''Act'''
+        # Read the child task and its new parent, update the changed columns, then roll up the old and new parents.
+        with self.assertNumQueries(4):
+            response = self.client.put(child_url, child_body, format='json')
+        invalid_response = self.client.put(child_url, {'child_task_name': "Incomplete"}, format='json')
+
+        '''Assert'''
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['parent_task_id'], self.tasks[1].id)
+        self.assertEqual(ChildTask.objects.get(id=self.child_tasks[0].id).parent_task_id_id, self.tasks[1].id)
+        self.assertEqual(invalid_response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patch_task_and_list(self):
+        """
+        Unit test that updating a task or a list reads the records nested in the response with one query per level.
+        :return: None
+        """
+        '''Act'''
+        with self.assertNumQueries(3):
+            task_response = self.client.patch('/v1/tasks/' + str(self.tasks[0].id) + '/', {'task_name': "Renamed"},
+                                              format='json')
+        with self.assertNumQueries(4):
+            list_response = self.client.patch('/v1/lists/' + str(self.todo_list.id) + '/',
+                                              {'list_name': "Renamed"}, format='json')
+
+        '''Assert'''
+        self.assertEqual(task_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(task_response.data['child_tasks']), 2)
+        self.assertEqual(list_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list_response.data['list_name'], "Renamed")
+        self.assertEqual(len(list_response.data['tasks']), 3)
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard1', 'shard2'])
+class ShardRouterTestCase(TodoAPITestCase):
+    """
+    Unit tests for routing sharded records to their shard. No query is made, so the shards need not exist.
+    """
+
+    def test_shard_for_id(self):
+        """
+        Unit test that a record's ID tells which shard holds it.
+        :return: None
+        """
+        '''Arrange'''
+        record_ids = [3, 4, 5, 301]
+
+        '''Act'''
+        shards = [shard_for_id(record_id) for record_id in record_ids]
+
+        '''Assert'''
+        self.assertEqual(shards, ['default', 'shard1', 'shard2', 'shard1'])
+
+    def test_queries_routed(self):
+        """
+        Unit test that queries on sharded models go to the current shard, or the shard an instance was read from,
+        and queries on other models to the next router.
+        :return: None
+        """
+        '''Arrange'''
+        todo_list = ToDoList(id=4)
+        todo_list._state.db = 'shard1'
+
+        '''Act'''
+        with use_shard('shard2'):
+            task_db = router.db_for_write(ParentTask)
+            job_db = router.db_for_read(BackgroundJob)
+            instance_db = router.db_for_read(ParentTask, instance=todo_list)
+
+        '''Assert'''
+        self.assertEqual(task_db, 'shard2')
+        self.assertEqual(job_db, 'default')
+        self.assertEqual(instance_db, 'shard1')
+        # Outside use_shard, the first shard is used
+        self.assertEqual(router.db_for_read(ChildTask), 'default')
+        # Only the sharded tables are created on the other shards
+        self.assertTrue(router.allow_migrate('shard1', 'todo_list', model_name='childtask'))
+        self.assertFalse(router.allow_migrate('shard1', 'todo_list', model_name='backgroundjob'))
+        self.assertFalse(router.allow_migrate('shard1', 'auth', model_name='permission'))
+
+
+@unittest.skipUnless(len(settings.DATABASE_SHARDS) > 1, 'Run with TODO_API_SHARDS=3 to test sharding.')
+class ShardingTestCase(TodoAPITestCase):
+    """
+    Unit tests for lists sharded over several databases.
+    """
+
+    def test_create_on_one_shard(self):
+        """
+        Unit test that a new list, its tasks and their child tasks are all stored on the list's shard.
+        :return: None
+        """
+        '''Arrange'''
+        last_shard = settings.DATABASE_SHARDS[-1]
+
+        '''Act'''
+        with mock.patch('todo_list.views.random.choice', side_effect=lambda shards: shards[-1]):
+            list_id = self.client.post('/v1/lists/', {'list_name': "A List", 'list_description': "Things"},
+                                       format='json').data['id']
+        task_id = self.client.post('/v1/tasks/', {'todo_list_id': list_id, 'task_name': "Do a little dance",
+                                                  'task_description': "Make a little love",
+                                                  'task_due_date': "2018-04-20T12:00:00"}, format='json').data['id']
+        child_id = self.client.post('/v1/child_tasks/', {'parent_task_id': task_id, 'child_task_name': "square dance",
+                                                         'child_task_description': "swing yer partner",
+                                                         'child_task_due_date': "2018-03-29T12:00:00"},
+                                    format='json').data['id']
+        get_response = self.client.get('/v1/lists/' + str(list_id) + '/')
+
+        '''Assert'''
+        self.assertEqual([shard_for_id(list_id), shard_for_id(task_id), shard_for_id(child_id)], [last_shard] * 3)
+        self.assertTrue(ChildTask.objects.using(last_shard).filter(id=child_id, parent_task_id=task_id).exists())
+        self.assertFalse(ToDoList.objects.using('default').filter(id=list_id).exists())
+        self.assertEqual(get_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_response.data['tasks'][0]['id'], task_id)
+
+    def test_complete_routed(self):
+        """
+        Unit test that completing a child task, then a task, updates them on their shard.
+        :return: None
+        """
+        '''Arrange'''
+        last_shard = settings.DATABASE_SHARDS[-1]
+        with use_shard(last_shard):
+            task = self.create_list().tasks.get()
+            other_task = self.create_list().tasks.get()
+        child_task = task.child_tasks.get()
+        other_child_task = other_task.child_tasks.get()
+
+        '''Act'''
+        child_response = self.client.post('/v1/child_tasks/complete_child_task/', {'child_task_id': child_task.id},
+                                          format='json')
+        task_response = self.client.post('/v1/tasks/complete_task/', {'task_id': other_task.id}, format='json')
+
+        '''Assert'''
+        self.assertEqual(child_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(task_response.status_code, status.HTTP_200_OK)
+        tasks = ParentTask.objects.using(last_shard)
+        child_tasks = ChildTask.objects.using(last_shard)
+        # The last child task completed completes its parent
+        self.assertIsNotNone(tasks.get(id=task.id).task_completed_date)
+        self.assertIsNotNone(child_tasks.get(id=other_child_task.id).child_task_completed_date)
+
+    def test_list_gathered(self):
+        """
+        Unit test that listing lists gathers them from every shard, in ID order, page by page.
+        :return: None
+        """
+        '''Arrange'''
+        list_ids = []
+        for alias in settings.DATABASE_SHARDS * 2:
+            with use_shard(alias):
+                list_ids.append(self.create_list().id)
+        list_ids.sort()
+
+        '''Act'''
+        list_response = self.client.get('/v1/lists/')
+        page_response = self.client.get('/v1/lists/?limit=2&offset=3')
+        task_response = self.client.get('/v1/tasks/')
+
+        '''Assert'''
+        self.assertEqual([todo_list['id'] for todo_list in list_response.data], list_ids)
+        self.assertEqual(page_response.data['count'], len(list_ids))
+        self.assertEqual([todo_list['id'] for todo_list in page_response.data['results']], list_ids[3:5])
+        self.assertIsNotNone(page_response.data['next'])
+        self.assertEqual(len(task_response.data), len(list_ids))
+
+    def test_sequence_seeded(self):
+        """
+        Unit test that the first IDs allocated on a shard come after those already in use there, archived ones
+        included.
+        :return: None
+        """
+        '''Arrange'''
+        shard_count = len(settings.DATABASE_SHARDS)
+        ToDoList.objects.bulk_create([ToDoList(id=10 * shard_count, list_name="Old List", list_description="Old")])
+        ArchivedParentTask.objects.bulk_create([ArchivedParentTask(
+            id=20 * shard_count, todo_list_id_id=10 * shard_count, task_name="Old task", task_description="Old",
+            task_due_date=datetime(2018, 4, 20, 12), task_archived_date=datetime(2018, 4, 21, 12))])
+
+        '''Act'''
+        with use_shard('default'):
+            todo_list = self.create_list()
+        task = todo_list.tasks.get()
+        child_task = task.child_tasks.get()
+
+        '''Assert'''
+        self.assertGreater(todo_list.id, 10 * shard_count)
+        self.assertGreater(task.id, 20 * shard_count)
+        self.assertEqual([shard_for_id(todo_list.id), shard_for_id(task.id), shard_for_id(child_task.id)],
+                         ['default'] * 3)
+
+    def test_misplaced_ids_checked(self):
+        """
+        Unit test that the system checks report rows whose ID points to another shard, e.g. rows written before
+        sharding was enabled.
+        :return: None
+        """
+        '''Arrange'''
+        with use_shard(settings.DATABASE_SHARDS[-1]):
+            self.create_list()
+        ToDoList.objects.bulk_create([ToDoList(id=len(settings.DATABASE_SHARDS) * 10 + 1, list_name="Old List",
+                                               list_description="Written before sharding")])
+
+        '''Act'''
+        errors = check_shard_ids()
+
+        '''Assert'''
+        self.assertEqual([(error.id, error.obj) for error in errors], [('todo_list.E001', ToDoList)])
+        self.assertIn('"default"', errors[0].msg)
+        # It scans whole tables, so it is left out of the checks run by every manage.py command
+        self.assertEqual(check_shard_ids.tags, ('database',))
+
+    def test_import_refused(self):
+        """
+        Unit test that imports, which would break the link between IDs and shards, are refused.
+        :return: None
+        """
+        '''Arrange'''
+        stream = io.StringIO('')
+
+        '''Act'''
+        with mock.patch('sys.stdin', stream), self.assertRaises(CommandError) as raised:
+            call_command('import_todos', '-')
+
+        '''Assert'''
+        self.assertIn('not supported', str(raised.exception))
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.throttling.py
+
+Token bucket throttles, extending Django REST Framework's throttling API.
+See framework documentation: http://www.django-rest-framework.org/api-guide/throttling/
+
+Each client has a bucket per scope holding up to N tokens, refilled at N tokens per period, where the scope's rate
+"N/period" comes from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] (period is one of sec, min, hour or day). Every
+request takes a token; a request finding its bucket empty is refused with 429 Too Many Requests and a Retry-After
+header giving the seconds until the next token. Unlike DRF's fixed-window throttles, a bucket allows short bursts
+of up to N requests while holding the sustained rate to N per period.
+
+Buckets are kept in the cache named by settings.TODO_LIST_THROTTLE_CACHE. For limits to hold across worker
+processes, that cache must be shared between them. Reading and updating a bucket is not atomic, so under heavy
+concurrency a client may occasionally get a request or two more than its rate.
+"""
+
+from __future__ import division, unicode_literals
+
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    :param rate: A rate string such as "60/min".
+    :return: Tuple of the bucket capacity and the period in seconds over which it refills.
+    """
+    capacity, period = rate.split('/')
+    return int(capacity), PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class for token bucket throttles. Subclasses decide which scope applies to a request, and how the client
+    is identified.
+    """
+    timer = time.time
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_scope(self, request, view):
+        """
+        :return: The name of the rate that applies to the request, or None to let it through unthrottled.
+        """
+        raise NotImplementedError('.get_scope() must be overridden')
+
+    def get_client_ident(self, request):
+        """
+        :return: A string identifying the client: its user ID if authenticated, otherwise its IP address.
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return 'user_%s' % user.pk
+        return 'ip_%s' % self.get_ident(request)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        cache = caches[settings.TODO_LIST_THROTTLE_CACHE]
+        key = self.cache_format % {'scope': scope, 'ident': self.get_client_ident(request)}
+        now = self.timer()
+
+        # Refill the bucket for the time elapsed since it was last used.
+        tokens, last_used = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - last_used) * capacity / period)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.wait_seconds = (1 - tokens) * period / capacity
+
+        # A bucket left untouched for a whole period is full again, so it need not outlive that.
+        cache.set(key, (tokens, now), period)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    """
+    Limits each unauthenticated client, by IP address, to the "anon" rate across the whole API.
+    """
+
+    def get_scope(self, request, view):
+        user = getattr(request, 'user', None)
+        return 'anon' if user is None or not user.is_authenticated else None
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """
+    Limits each authenticated user to the "user" rate across the whole API.
+    """
+
+    def get_scope(self, request, view):
+        user = getattr(request, 'user', None)
+        return 'user' if user is not None and user.is_authenticated else None
+
+
+class EndpointBucketThrottle(TokenBucketThrottle):
+    """
+    Gives each client separate, stricter buckets for expensive endpoints.
+    A view names the scope of each of its actions in a `throttle_scopes` dict; actions not named there fall in the
+    "write" scope if they modify data, and are otherwise left to the client-wide throttles.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if scope is None and request.method not in SAFE_METHODS:
+            scope = 'write'
+        return scope
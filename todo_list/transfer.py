@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+todo_list.transfer.py
+
+Streaming bulk export and import of the ToDoList / ParentTask / ChildTask hierarchy, used by the `export_todos`
+and `import_todos` management commands.
+
+Every row is represented as a flat record with the same fields whatever its type:
+
+    type            "list", "task" or "child_task"
+    id              the row's ID
+    parent_id       the ID of the owning list (tasks) or parent task (child tasks); empty for lists
+    name            list_name, task_name or child_task_name
+    description     list_description, task_description or child_task_description
+    due_date        ISO 8601 due date; empty for lists
+    completed_date  ISO 8601 completion date; empty for lists and incomplete tasks
+
+Records are written as NDJSON (one JSON object per line) or CSV (one row per record, with a header). Exports write
+all lists, then all tasks, then all child tasks, so that every parent precedes its children; imports rely on that
+order.
+
+Neither direction holds more than one chunk of rows in memory: exports read with server-side cursors, and imports
+insert with bulk_create in batches. Imported rows get new IDs so that they never collide with existing ones; rather
+than keeping a map from old to new IDs, which would grow with the dataset, each type's IDs are shifted by a fixed
+offset (the highest ID in use for that type when the import starts, counting archived tasks and child tasks since
+they keep their IDs), and parent references are shifted by the parent type's offset.
+
+When lists are sharded (see todo_api.db_routers.ShardRouter), exports read every shard in turn, but imports are not
+supported: shifting IDs by an offset would break the link between IDs and shards.
+"""
+
+from __future__ import unicode_literals
+
+import csv
+import json
+from itertools import chain
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+from todo_api.db_routers import shard_aliases
+from todo_list.models import ToDoList, ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask
+
+RECORD_FIELDS = ('type', 'id', 'parent_id', 'name', 'description', 'due_date', 'completed_date')
+
+FORMATS = ('ndjson', 'csv')
+
+# For each record type, in export order: the model, and the model field backing each record field after "type".
+# The parent type's name is given so imports can shift parent references.
+RECORD_TYPES = (
+    ('list', ToDoList, None,
+     ('id', None, 'list_name', 'list_description', None, None)),
+    ('task', ParentTask, 'list',
+     ('id', 'todo_list_id', 'task_name', 'task_description', 'task_due_date', 'task_completed_date')),
+    ('child_task', ChildTask, 'task',
+     ('id', 'parent_task_id', 'child_task_name', 'child_task_description', 'child_task_due_date',
+      'child_task_completed_date')),
+)
+
+# Archived tasks and child tasks keep their IDs (see todo_list.archival), so imported IDs must not collide with theirs.
+ARCHIVE_MODELS = {
+    'task': ArchivedParentTask,
+    'child_task': ArchivedChildTask,
+}
+
+
+def export_records(chunk_size=2000):
+    """
+    Stream every list, task and child task as a flat record, parents before children.
+    :param chunk_size: Number of rows fetched from the database cursor at a time.
+    :return: A generator of record dicts.
+    """
+    for record_type, model, _, model_fields in RECORD_TYPES:
+        columns = [field for field in model_fields if field is not None]
+        rows = chain.from_iterable(model.objects.using(alias).order_by('id').values_list(*columns)
+                                   .iterator(chunk_size=chunk_size) for alias in shard_aliases())
+
+        for row in rows:
+            values = iter(row)
+            record = {'type': record_type}
+            for record_field, model_field in zip(RECORD_FIELDS[1:], model_fields):
+                value = next(values) if model_field is not None else None
+                if hasattr(value, 'isoformat'):
+                    value = value.isoformat()
+                record[record_field] = value
+            yield record
+
+
+def write_records(records, stream, fmt):
+    """
+    Write records to a text stream.
+    :param records: Iterable of record dicts.
+    :param stream: A writable text stream.
+    :param fmt: "ndjson" or "csv".
+    :return: The number of records written.
+    """
+    count = 0
+
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=RECORD_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record) + '\n')
+            count += 1
+
+    return count
+
+
+def read_records(stream, fmt):
+    """
+    Read records from a text stream written by write_records.
+    :param stream: A readable text stream.
+    :param fmt: "ndjson" or "csv".
+    :return: A generator of record dicts.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            # CSV has no nulls; empty cells stand for them.
+            yield dict((field, value if value != '' else None) for field, value in row.items())
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def max_id(record_type, model, using):
+    """
+    :param record_type: "list", "task" or "child_task".
+    :param model: The record type's model.
+    :param using: Database alias.
+    :return: The highest ID in use for the record type, live or archived, or 0 if there is none.
+    """
+    models = [model] + ([ARCHIVE_MODELS[record_type]] if record_type in ARCHIVE_MODELS else [])
+    return max(model.objects.using(using).aggregate(max_id=Max('id'))['max_id'] or 0 for model in models)
+
+
+def import_records(records, batch_size=1000):
+    """
+    Insert records as new lists, tasks and child tasks, in batches and in a single transaction.
+    :param records: Iterable of record dicts, parents before children.
+    :param batch_size: Number of rows inserted per bulk_create call.
+    :return: Dict mapping each record type to the number of rows imported.
+    """
+    record_types = dict((record_type, (model, parent_type, model_fields))
+                        for record_type, model, parent_type, model_fields in RECORD_TYPES)
+    using = router.db_for_write(ToDoList)
+    counts = dict((record_type, 0) for record_type in record_types)
+
+    with transaction.atomic(using=using):
+        offsets = dict((record_type, max_id(record_type, model, using))
+                       for record_type, (model, _, _) in record_types.items())
+        pending = dict((record_type, []) for record_type in record_types)
+
+        def flush():
+            # Parents are always flushed before their children.
+            for record_type, model, _, _ in RECORD_TYPES:
+                if pending[record_type]:
+                    model.objects.using(using).bulk_create(pending[record_type])
+                    counts[record_type] += len(pending[record_type])
+                    pending[record_type] = []
+
+        for record in records:
+            if record['type'] not in record_types:
+                raise ValueError('Unknown record type: %r' % record['type'])
+            model, parent_type, model_fields = record_types[record['type']]
+
+            values = {}
+            for record_field, model_field in zip(RECORD_FIELDS[1:], model_fields):
+                if model_field is None:
+                    continue
+                value = record.get(record_field)
+                if record_field == 'id':
+                    value = int(value) + offsets[record['type']]
+                elif record_field == 'parent_id':
+                    # Assign the raw foreign key value (e.g. todo_list_id_id) rather than fetching the parent.
+                    model_field = model._meta.get_field(model_field).attname
+                    value = int(value) + offsets[parent_type]
+                elif record_field in ('due_date', 'completed_date') and value is not None:
+                    value = parse_datetime(value)
+                values[model_field] = value
+
+            pending[record['type']].append(model(**values))
+            if len(pending[record['type']]) >= batch_size:
+                flush()
+
+        flush()
+
+        # IDs were assigned explicitly, so bring the database's ID sequences (where it has them) up to date.
+        connection = connections[using]
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [model for _, model, _, _ in RECORD_TYPES])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    return counts
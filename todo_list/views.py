@@ -14,29 +14,293 @@ from __future__ import unicode_literals
 
 # Create your views here.
 
+import base64
+import heapq
+import io
+import json
+import random
+import re
+from collections import OrderedDict
+from contextlib import ExitStack
 from datetime import datetime
-from todo_list.models import ToDoList, ParentTask, ChildTask
+from itertools import chain, islice
+from operator import attrgetter
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import Resolver404, resolve
+from todo_list.models import ToDoList, ParentTask, ChildTask, ArchivedParentTask, ArchivedChildTask, BackgroundJob
 from rest_framework import viewsets, status
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
+from todo_api import profiling
+from todo_api.db_routers import owning_shard, set_current_shard, shard_aliases, shard_for_id, sharding_enabled, \
+    use_shard
+from todo_list.deletion import delete_list_in_batches
+from todo_list.jobs import background_jobs_enabled, enqueue_job
+from todo_list.renderers import COMPACT_RENDERERS
 from todo_list.serializers import TodoListSerializer, ParentTaskSerializer, ChildTaskSerializer, \
-    ChildTaskCompletionSerializer, ParentTaskCompletionSerializer
+    ChildTaskCompletionSerializer, ParentTaskCompletionSerializer, BackgroundJobSerializer, BatchRequestSerializer, \
+    ArchivedParentTaskSerializer, ArchivedChildTaskSerializer
 
 
-class TodoListTaskViewSet(viewsets.ModelViewSet):
+def shard_querysets(queryset):
+    """
+    :param queryset: A queryset of a sharded model.
+    :return: List of the queryset on each shard; just the queryset when sharding is disabled.
+    """
+    return [queryset.using(alias) for alias in shard_aliases()]
+
+
+class ShardMixin(object):
+    """
+    Serves each request from the shard holding the records it is about, when sharding is enabled (see
+    todo_api.db_routers.ShardRouter): the shard of the ID in the URI or, for actions named in `shard_keys`, of the
+    ID in the request body field named there. New lists are put on a random shard.
+    The list action gathers the records of every shard, merged in ID order, with limit/offset pagination when the
+    viewset has a paginator.
+    """
+    shard_keys = {}
+
+    def get_shard(self, request):
+        """
+        :param request: Request data object
+        :return: Alias of the shard to serve the request from, or None if it is not about a particular record.
+        """
+        record_id = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if record_id is None and self.action in self.shard_keys and isinstance(request.data, dict):
+            record_id = request.data.get(self.shard_keys[self.action])
+        elif record_id is None and self.action == 'create':
+            return random.choice(settings.DATABASE_SHARDS)
+
+        try:
+            return shard_for_id(int(record_id))
+        except (TypeError, ValueError):
+            return None
+
+    def initial(self, request, *args, **kwargs):
+        if sharding_enabled():
+            set_current_shard(self.get_shard(request))
+        super(ShardMixin, self).initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        set_current_shard(None)
+        return super(ShardMixin, self).finalize_response(request, response, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Override ModelViewSet's "list" method to scatter the query to every shard and gather the results.
+        :param request: Request data object
+        :return: a Response object
+        """
+        if not sharding_enabled():
+            return super(ShardMixin, self).list(request, *args, **kwargs)
+
+        querysets = shard_querysets(self.filter_queryset(self.get_queryset()).order_by('pk'))
+        paginator = self.paginator
+        limit = paginator.get_limit(request) if paginator is not None else None
+
+        if limit is None:
+            records = list(heapq.merge(*querysets, key=attrgetter('pk')))
+            return Response(self.get_serializer(records, many=True).data)
+
+        # Find the IDs on the page from the first offset + limit IDs of each shard, then read just those records.
+        offset = paginator.get_offset(request)
+        shard_ids = [queryset.values_list('pk', flat=True)[:offset + limit] for queryset in querysets]
+        page_ids = list(islice(heapq.merge(*shard_ids), offset, offset + limit))
+        records = sorted(chain.from_iterable(queryset.filter(pk__in=page_ids) for queryset in querysets),
+                         key=attrgetter('pk'))
+
+        paginator.request, paginator.limit, paginator.offset = request, limit, offset
+        paginator.count = sum(queryset.count() for queryset in querysets)
+        return paginator.get_paginated_response(self.get_serializer(records, many=True).data)
+
+
+class CompactFormatsMixin(object):
+    """
+    Offers the compact response formats of todo_list.renderers alongside the default ones.
+    The columnar formats are only offered by the list action of viewsets naming the model fields to put in columns,
+    in `columnar_fields`.
+    """
+    columnar_fields = ()
+
+    def get_renderers(self):
+        renderers = super(CompactFormatsMixin, self).get_renderers()
+        columnar = bool(self.columnar_fields) and getattr(self, 'action', None) == 'list'
+
+        for renderer_class in COMPACT_RENDERERS:
+            if renderer_class.is_available() and (columnar or not renderer_class.columnar):
+                renderers.append(renderer_class())
+        return renderers
+
+    def wants_columns(self, request):
+        """
+        :param request: Request data object
+        :return: Boolean, True/False, the response was negotiated in a columnar format.
+        """
+        return getattr(getattr(request, 'accepted_renderer', None), 'columnar', False)
+
+    def list_columns(self, querysets):
+        """
+        Lay the records out in columns: one array of values per field, rather than one object per record.
+        The values are appended to their columns straight from the database cursor's rows, without building a
+        model instance or a dict for each record.
+        :param querysets: The querysets whose records to list, one after the other.
+        :return: a Response object holding the server's current datetime, the record count and the columns.
+        """
+        current_dtm = datetime.now()
+        columns = OrderedDict((field, []) for field in self.columnar_fields)
+        appenders = [column.append for column in columns.values()]
+
+        for queryset in querysets:
+            for row in queryset.values_list(*self.columnar_fields).iterator():
+                for append, value in zip(appenders, row):
+                    append(value)
+
+        return Response({'request_date': current_dtm, 'count': len(columns[self.columnar_fields[0]]),
+                         'columns': columns})
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Errors are not collections, so they are reported in JSON rather than in a columnar format.
+        if getattr(response, 'exception', False) and self.wants_columns(request):
+            request.accepted_renderer, request.accepted_media_type = JSONRenderer(), JSONRenderer.media_type
+        return super(CompactFormatsMixin, self).finalize_response(request, response, *args, **kwargs)
+
+
+class UpdateMixin(object):
+    """
+    Makes a viewset's PUT and PATCH requests take as few queries as possible: the record is read once, validated once,
+    only its changed columns are written (see UpdateFieldsModelSerializer), and the related records nested in the
+    response are read along with it, with one query per level named in `update_prefetch`.
+    """
+    update_prefetch = ()
+
+    def get_queryset(self):
+        queryset = super(UpdateMixin, self).get_queryset()
+        if getattr(self, 'action', None) in ('update', 'partial_update') and self.update_prefetch:
+            queryset = queryset.prefetch_related(*self.update_prefetch)
+        return queryset
+
+    def update(self, request, *args, **kwargs):
+        """
+        Override ModelViewSet's "update" method to keep the prefetched related records for the response, which
+        ModelViewSet reads again in case the update changed them. Nested records are read-only here, so it cannot.
+        :param request: Request data object
+        :return: a Response object
+        """
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+
+class TodoListTaskViewSet(ShardMixin, UpdateMixin, CompactFormatsMixin, viewsets.ModelViewSet):
     """
     API endpoint providing access to todo lists.
     """
-    queryset = ToDoList.objects.all()
+    queryset = ToDoList.objects.order_by('id')
+    pagination_class = LimitOffsetPagination
     serializer_class = TodoListSerializer
+    update_prefetch = ('tasks__child_tasks',)
+
+    # Lists are serialized with all their tasks and child tasks, so reading them gets its own, stricter, rate limit.
+    throttle_scopes = {'list': 'nested_list', 'retrieve': 'nested_list'}
+
+    def destroy(self, request, pk=None):
+        """
+        Override ModelViewSet's "destroy" method to hand large deletions to the background job queue.
+        Deleting a list cascades to all of its tasks and child tasks, which are deleted in batches of
+        settings.TODO_LIST_DELETE_BATCH_SIZE rows. When background jobs are enabled, the cascade is queued and a 202
+        response carrying the job's status URL is returned instead.
+        :param request: Request data object
+        :param pk: ID of the list to delete
+        :return: a Response object
+        """
+        todo_list = self.get_object()
+
+        if not background_jobs_enabled():
+            # Delete the list's hierarchy in bounded batches rather than through Django's in-memory collector.
+            for _ in delete_list_in_batches(todo_list.id, settings.TODO_LIST_DELETE_BATCH_SIZE):
+                pass
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        job = enqueue_job(BackgroundJob.DELETE_LIST, todo_list.id)
+
+        return Response({'status': 'List deletion queued',
+                         'list_id': todo_list.id,
+                         'job_url': reverse('backgroundjob-detail', args=[job.id], request=request)},
+                        status=status.HTTP_202_ACCEPTED)
 
 
-class ParentTaskViewSet(viewsets.ModelViewSet):
+class ArchiveMixin(object):
+    """
+    Lets a viewset's read actions include archived records, when the request asks for them with ?include_archived=1.
+    Archived records are read-only, so the other actions only ever see live ones.
+    """
+    archived_queryset = None
+    archived_serializer_class = None
+
+    def include_archived(self, request):
+        """
+        :param request: Request data object
+        :return: Boolean, True/False, the request asked for archived records too.
+        """
+        return request.GET.get('include_archived') in ('1', 'true', 'True')
+
+    def list_querysets(self, request):
+        """
+        :param request: Request data object
+        :return: The querysets of the records to list, on every shard: the live ones, then the archived ones if asked.
+        """
+        querysets = shard_querysets(self.filter_queryset(self.get_queryset()))
+        if self.include_archived(request):
+            querysets.extend(shard_querysets(self.archived_queryset.all()))
+        return querysets
+
+    def list_archived(self, request):
+        """
+        :param request: Request data object
+        :return: The serialized archived records, if the request asked for them; otherwise an empty list.
+        """
+        if not self.include_archived(request):
+            return []
+        archived = chain.from_iterable(shard_querysets(self.archived_queryset.all()))
+        return self.archived_serializer_class(archived, many=True, context=self.get_serializer_context()).data
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Override ModelViewSet's "retrieve" method to fall back on the archive when asked to.
+        :param request: Request data object
+        :return: a Response object
+        """
+        try:
+            return super(ArchiveMixin, self).retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived(request):
+                raise
+            instance = get_object_or_404(self.archived_queryset, pk=kwargs['pk'])
+            return Response(self.archived_serializer_class(instance, context=self.get_serializer_context()).data)
+
+
+class ParentTaskViewSet(ShardMixin, UpdateMixin, CompactFormatsMixin, ArchiveMixin, viewsets.ModelViewSet):
     """
     API endpoint that hopefully works
     """
     queryset = ParentTask.objects.all()
     serializer_class = ParentTaskSerializer
+    archived_queryset = ArchivedParentTask.objects.all()
+    archived_serializer_class = ArchivedParentTaskSerializer
+    update_prefetch = ('child_tasks',)
+    shard_keys = {'create': 'todo_list_id', 'complete_task': 'task_id'}
+    columnar_fields = ('id', 'todo_list_id', 'task_name', 'task_description', 'task_due_date', 'task_completed_date')
 
     request = None
     format_kwarg = None
@@ -46,12 +310,16 @@ class ParentTaskViewSet(viewsets.ModelViewSet):
         Override ModelViewSet's "list" method to append the server's current datetime.
         This allows the front-end app to evaluate whether the task is past due at time of request
         based on the server's clock.
+        Responses in a columnar format carry the datetime once, next to the columns.
         :param request: Request data object
         :return: a Response object.
         """
+        if self.wants_columns(request):
+            return self.list_columns(self.list_querysets(request))
 
         current_dtm = datetime.now()
         response = super(ParentTaskViewSet, self).list(request)
+        response.data.extend(self.list_archived(request))
         for task in response.data:
             task['request_date'] = current_dtm
 
@@ -80,6 +348,15 @@ class ParentTaskViewSet(viewsets.ModelViewSet):
             completed_datetime = datetime.now()
             ParentTask.objects.filter(id__exact=task_id).update(task_completed_date=completed_datetime)
 
+            if background_jobs_enabled():
+                # Leave the child task cascade to a worker process and tell the client where to follow it.
+                job = enqueue_job(BackgroundJob.COMPLETE_TASK, task_id)
+                return Response({'status': 'Task completion queued',
+                                 'task_id': task_id,
+                                 'completed_datetime': completed_datetime,
+                                 'job_url': reverse('backgroundjob-detail', args=[job.id], request=request)},
+                                status=status.HTTP_202_ACCEPTED)
+
             # If the task has any "child" tasks, mark them all complete.
             incomplete_tasks = ChildTask.objects.filter(parent_task_id__exact=task_id,
                                                         child_task_completed_date__isnull=True)
@@ -98,12 +375,17 @@ class ParentTaskViewSet(viewsets.ModelViewSet):
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ChildTaskViewSet(viewsets.ModelViewSet):
+class ChildTaskViewSet(ShardMixin, UpdateMixin, CompactFormatsMixin, ArchiveMixin, viewsets.ModelViewSet):
     """
     API endpoint handling tasks that are children of a "parent" task, representing data in the ChildTask model.
     """
     queryset = ChildTask.objects.all()
     serializer_class = ChildTaskSerializer
+    archived_queryset = ArchivedChildTask.objects.all()
+    archived_serializer_class = ArchivedChildTaskSerializer
+    columnar_fields = ('id', 'parent_task_id', 'child_task_name', 'child_task_description', 'child_task_due_date',
+                       'child_task_completed_date')
+    shard_keys = {'create': 'parent_task_id', 'complete_child_task': 'child_task_id'}
 
     request = None
     format_kwarg = None
@@ -116,9 +398,10 @@ class ChildTaskViewSet(viewsets.ModelViewSet):
         """
         siblings_completed = False
 
-        incomplete_count = ChildTask.objects.filter(
-            parent_task_id__exact=parent_task_id, child_task_completed_date__isnull=True
-        ).count()
+        with use_shard(owning_shard(parent_task_id)):
+            incomplete_count = ChildTask.objects.filter(
+                parent_task_id__exact=parent_task_id, child_task_completed_date__isnull=True
+            ).count()
 
         if incomplete_count == 0:
             siblings_completed = True
@@ -130,11 +413,16 @@ class ChildTaskViewSet(viewsets.ModelViewSet):
         Override ModelViewSet's "list" method to append the server's current datetime.
         This allows the front-end app to evaluate whether the task is past due at time of request
         based on the server's clock.
+        Responses in a columnar format carry the datetime once, next to the columns.
         :param request: Request data object
         :return: a Response object
         """
+        if self.wants_columns(request):
+            return self.list_columns(self.list_querysets(request))
+
         current_dtm = datetime.now()
         response = super(ChildTaskViewSet, self).list(request)
+        response.data.extend(self.list_archived(request))
         for child_task in response.data:
             child_task['request_date'] = current_dtm
         return response
@@ -182,30 +470,254 @@ class ChildTaskViewSet(viewsets.ModelViewSet):
                 error_response = {'status': 'Invalid child task ID'}
             return Response(error_response, status=status.HTTP_400_BAD_REQUEST)
 
-    def update(self, request, pk=None):
+    def perform_update(self, serializer):
+        """
+        Override ModelViewSet's "perform_update" method to add some controls.
+        Because the update may signify the completion of a child task, we check to see if all the parent's child tasks
+        are complete. If so, we mark the parent task as completed. A child task moved to another parent task may leave
+        only completed child tasks behind, so its previous parent task is checked too.
+        :param serializer: The validated serializer of the updated child task
+        :return: None
+        """
+        previous_parent_task_id = serializer.instance.parent_task_id_id
+        child_task = serializer.save()
+
+        if {'child_task_completed_date', 'parent_task_id'} & set(serializer.changed_fields):
+            # Mark the parent tasks complete if they have child tasks and none remain incomplete, in a single UPDATE.
+            ParentTask.objects.filter(
+                id__in={previous_parent_task_id, child_task.parent_task_id_id}, child_tasks__isnull=False
+            ).exclude(
+                child_tasks__child_task_completed_date__isnull=True
+            ).update(task_completed_date=datetime.now())
+
+
+class BackgroundJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint reporting the status and progress of queued background jobs.
+    """
+    queryset = BackgroundJob.objects.all()
+    serializer_class = BackgroundJobSerializer
+
+
+class IsProfilingAdmin(BasePermission):
+    """
+    Allows access to staff users, and to requests carrying the profiling token (see todo_api.profiling).
+    """
+
+    def has_permission(self, request, view):
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff) or profiling.has_profiling_token(request)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    API endpoint serving the stored request profiles (see todo_api.profiling), most recent first, for download as
+    pstats files or as collapsed stacks for flame graph tools.
+    """
+    permission_classes = (IsProfilingAdmin,)
+    lookup_value_regex = r'[0-9]{14}-[0-9a-f]{8}'
+
+    def get_summary(self, request, pk):
+        """
+        :param request: Request data object
+        :param pk: ID of the profile
+        :return: Dict of the profile's summary, with links to its downloads.
         """
-        Override the ModelViewSet update method to add some controls.
-        This method gets called when a PUT request to the API updates a child task.
-        Because the request may signify the completion of a child task, we check to see if all the parent's child tasks
-        are complete. If so, we mark the parent task as completed.
-        :param request: The request body wrapped in a Model object
-        :param pk: not implemented
+        summary = profiling.load_summary(pk)
+        if summary is None:
+            raise Http404
+        summary['url'] = reverse('profile-detail', args=[pk], request=request)
+        summary['pstats_url'] = reverse('profile-pstats', args=[pk], request=request)
+        summary['collapsed_url'] = reverse('profile-collapsed', args=[pk], request=request)
+        return summary
+
+    def list(self, request):
+        """
+        List the stored profiles, leaving out their queries.
+        :param request: Request data object
         :return: a Response object
         """
-        child_task = self.get_object()
-        serializer = ChildTaskSerializer(data=request.data)
-        parent_task_id = serializer.data['parent_task_id']
-        if serializer.is_valid():
-            # Request passed validation.
-            response = super(ChildTaskViewSet, self).update(request, pk)
+        summaries = []
+        for profile_id in profiling.list_profile_ids():
+            try:
+                summary = self.get_summary(request, profile_id)
+            except Http404:
+                # Pruned since it was listed.
+                continue
+            del summary['queries']
+            summaries.append(summary)
+        return Response(summaries)
+
+    def retrieve(self, request, pk=None):
+        """
+        :param request: Request data object
+        :param pk: ID of the profile
+        :return: a Response object holding the profile's summary, including every query made.
+        """
+        return Response(self.get_summary(request, pk))
 
-            # Because the child task may have been updated, we now check to see whether
-            if self.check_siblings_completed(parent_task_id=child_task.parent_task_id):
-                # If no incomplete tasks remain, update the parent task as complete.
-                completed_datetime = datetime.now()
-                ParentTask.objects.filter(id__exact=parent_task_id).update(task_completed_date=completed_datetime)
+    @detail_route(methods=['get'])
+    def pstats(self, request, pk=None):
+        """
+        Download the profile in pstats format, e.g. for `python -m pstats` or snakeviz.
+        :param request: Request data object
+        :param pk: ID of the profile
+        :return: a HttpResponse object
+        """
+        if profiling.load_summary(pk) is None:
+            raise Http404
+        with open(profiling.profile_path(pk, 'prof'), 'rb') as stats_file:
+            response = HttpResponse(stats_file.read(), content_type='application/octet-stream')
+        response['Content-Disposition'] = 'attachment; filename="%s.prof"' % pk
+        return response
 
-            return response
-        else:
-            # The request did not pass validation; return a 400 header.
+    @detail_route(methods=['get'])
+    def collapsed(self, request, pk=None):
+        """
+        Download the profile as collapsed stacks, e.g. for flamegraph.pl or speedscope.
+        :param request: Request data object
+        :param pk: ID of the profile
+        :return: a HttpResponse object
+        """
+        stats = profiling.load_stats(pk)
+        if stats is None:
+            raise Http404
+        response = HttpResponse(''.join(line + '\n' for line in profiling.collapsed_stacks(stats)),
+                                content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="%s.collapsed.txt"' % pk
+        return response
+
+
+class BatchView(APIView):
+    """
+    API endpoint performing an ordered array of API calls in a single HTTP round trip.
+    Each sub-request is dispatched in-process straight to the view its path resolves to, without going through the
+    middleware stack again. The sub-requests share the batch request's headers, so they are authenticated (and
+    rate limited) as the batch's client.
+
+    A sub-request's path and body may refer to fields of earlier sub-responses as {{N.field}}, N being the index of
+    the earlier sub-request: e.g. {{0.id}} is the ID of the record created by the first sub-request.
+    """
+    reference_pattern = re.compile(r'\{\{\s*(\d+)\.([\w.]+)\s*\}\}')
+
+    def post(self, request):
+        """
+        Perform the sub-requests in order.
+        With "atomic" set, they are performed in one transaction (per shard): the batch stops at the first sub-request
+        that fails, and everything the earlier ones did is rolled back.
+        :param request: Request data object
+        :return: a Response object, holding the array of sub-responses
+        """
+        serializer = BatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        sub_requests = serializer.validated_data['requests']
+        responses = []
+
+        if serializer.validated_data['atomic']:
+            # One transaction per shard, committed one after the other: a batch spanning shards is rolled back
+            # everywhere if it fails, but is not guaranteed to be all-or-nothing if a shard fails to commit.
+            with ExitStack() as transactions:
+                for alias in shard_aliases():
+                    transactions.enter_context(transaction.atomic(using=alias))
+                for sub_request in sub_requests:
+                    responses.append(self.dispatch_sub_request(request, sub_request, responses))
+                    if responses[-1]['status'] >= 400:
+                        for alias in shard_aliases():
+                            transaction.set_rollback(True, using=alias)
+                        break
+        else:
+            for sub_request in sub_requests:
+                responses.append(self.dispatch_sub_request(request, sub_request, responses))
+
+        return Response(responses)
+
+    def resolve_references(self, value, responses):
+        """
+        Replace references to earlier sub-responses in a sub-request.
+        A string consisting of a single reference is replaced by the referenced value itself, keeping its type;
+        references embedded in longer strings are replaced by their text.
+        :param value: The sub-request, or any part of it.
+        :param responses: The sub-responses so far.
+        :return: The value, with references replaced.
+        """
+        if isinstance(value, dict):
+            return dict((key, self.resolve_references(item, responses)) for key, item in value.items())
+        if isinstance(value, list):
+            return [self.resolve_references(item, responses) for item in value]
+        if not isinstance(value, str):
+            return value
+
+        def lookup(match):
+            referenced = responses[int(match.group(1))]['body']
+            for field in match.group(2).split('.'):
+                referenced = referenced[int(field) if isinstance(referenced, list) else field]
+            return referenced
+
+        whole_match = self.reference_pattern.fullmatch(value)
+        if whole_match:
+            return lookup(whole_match)
+        return self.reference_pattern.sub(lambda match: str(lookup(match)), value)
+
+    def dispatch_sub_request(self, request, sub_request, responses):
+        """
+        Build a request for one sub-request and pass it to the view its path resolves to.
+        :param request: The batch request.
+        :param sub_request: Dict holding the sub-request's method, path and optional body.
+        :param responses: The sub-responses so far, which the sub-request may refer to.
+        :return: Dict holding the sub-response's status code and body.
+        """
+        try:
+            sub_request = self.resolve_references(sub_request, responses)
+        except (LookupError, TypeError, ValueError):
+            # e.g. {{0.foo}} into a list, or {{0.id.name}} into a number
+            return {'status': status.HTTP_400_BAD_REQUEST,
+                    'body': {'detail': 'Reference to an unknown field of an earlier response.'}}
+
+        path, _, query_string = sub_request['path'].partition('?')
+
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Not found.'}}
+
+        view_class = getattr(match.func, 'cls', None)
+        if view_class is BatchView:
+            return {'status': status.HTTP_400_BAD_REQUEST, 'body': {'detail': 'Batch requests cannot be nested.'}}
+        if view_class is None or not issubclass(view_class, APIView):
+            # e.g. the browsable API's login views
+            return {'status': status.HTTP_400_BAD_REQUEST, 'body': {'detail': 'Only API endpoints can be batched.'}}
+
+        body = json.dumps(sub_request['body']).encode('utf-8') if 'body' in sub_request else b''
+        environ = dict(request.META,
+                       REQUEST_METHOD=sub_request['method'],
+                       PATH_INFO=path,
+                       QUERY_STRING=query_string,
+                       CONTENT_TYPE='application/json',
+                       CONTENT_LENGTH=str(len(body)))
+        environ['wsgi.input'] = io.BytesIO(body)
+
+        sub_http_request = WSGIRequest(environ)
+        # The batch request has already been authenticated, and checked for CSRF, on its way in.
+        if hasattr(request._request, 'user'):
+            sub_http_request.user = request._request.user
+        sub_http_request._dont_enforce_csrf_checks = True
+
+        response = match.func(sub_http_request, *match.args, **match.kwargs)
+
+        if hasattr(response, 'data'):
+            return {'status': response.status_code, 'body': response.data}
+
+        if hasattr(response, 'render'):
+            response.render()
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+
+        if response.get('Content-Type', '').startswith('application/json') and content:
+            return {'status': response.status_code, 'body': json.loads(content.decode('utf-8'))}
+        try:
+            return {'status': response.status_code, 'body': content.decode('utf-8') or None}
+        except UnicodeDecodeError:
+            # Binary content, e.g. a pstats file, which JSON cannot hold as it is.
+            return {'status': response.status_code, 'body': base64.b64encode(content).decode('ascii'),
+                    'body_encoding': 'base64'}